@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_caches():
+    """Кэш тестов - во временном каталоге, как у manage.py test."""
+    from core.test_runner import temporary_caches
+
+    with temporary_caches():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(test_caches):
+    """База откатывается после каждого теста, а кэш - нет."""
+    from django.core.cache import cache
+
+    cache.clear()
@@ -0,0 +1,230 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed)',
+)
+# Ограничение SQLite на число параметров запроса
+MAX_QUERY_PARAMS = 500
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite в режиме WAL, общий для процессов узла.
+
+    LOCATION - путь к файлу. Кроме стандартных, поддерживаются параметры
+    OPTIONS:
+    MAX_SIZE - предельный объём значений в байтах;
+    CULL_EVERY - через сколько записей процесс проверяет пределы;
+    ACCESS_RESOLUTION - как часто (в секундах) чтение обновляет время
+    обращения к ключу; по нему вытесняются давно не читанные ключи.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 256 * 1024 * 1024))
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._access_resolution = float(options.get('ACCESS_RESOLUTION', 10))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _connection(self):
+        # Соединение SQLite нельзя передавать между потоками
+        # и наследовать после fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _select(self, keys):
+        now = time.time()
+        rows = []
+        for start in range(0, len(keys), MAX_QUERY_PARAMS):
+            chunk = keys[start:start + MAX_QUERY_PARAMS]
+            marks = ','.join('?' * len(chunk))
+            rows += self._connection.execute(
+                f'SELECT key, value, accessed FROM cache WHERE key IN '
+                f'({marks}) AND (expires IS NULL OR expires > ?)',
+                (*chunk, now),
+            ).fetchall()
+        stale = [
+            key for key, _, accessed in rows
+            if accessed < now - self._access_resolution
+        ]
+        for start in range(0, len(stale), MAX_QUERY_PARAMS):
+            chunk = stale[start:start + MAX_QUERY_PARAMS]
+            marks = ','.join('?' * len(chunk))
+            self._connection.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({marks})',
+                (now, *chunk),
+            )
+        return {key: pickle.loads(value) for key, value, _ in rows}
+
+    def _row(self, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return key, value, self._expires(timeout), time.time(), len(value)
+
+    def _written(self, count=1):
+        self._writes += count
+        if self._writes >= self._cull_every:
+            self._writes = 0
+            self._cull()
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._select([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        return {
+            keys[key]: value
+            for key, value in self._select(list(keys)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = [
+            self._row(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)', rows
+            )
+        self._written(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        row = self._row(self._key(key, version), value, timeout)
+        with self._transaction() as connection:
+            added = connection.execute(
+                'INSERT INTO cache VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires, accessed = excluded.accessed, '
+                'size = excluded.size '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (*row, time.time()),
+            ).rowcount
+        self._written()
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            return bool(connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), key, time.time()),
+            ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (data, len(data), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as connection:
+            for start in range(0, len(keys), MAX_QUERY_PARAMS):
+                chunk = keys[start:start + MAX_QUERY_PARAMS]
+                marks = ','.join('?' * len(chunk))
+                connection.execute(
+                    f'DELETE FROM cache WHERE key IN ({marks})', chunk
+                )
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def _cull(self):
+        """Удаляет просроченные ключи, а при превышении пределов -
+        давно не читанные, пока не останется доля 1 - 1/CULL_FREQUENCY.
+        """
+        keep = 1 - 1 / self._cull_frequency if self._cull_frequency else 0
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+            if count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)',
+                    (count - int(self._max_entries * keep),),
+                )
+            size = connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()[0]
+            if size > self._max_size:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM ('
+                    'SELECT key, size, SUM(size) OVER '
+                    '(ORDER BY accessed, key) AS total FROM cache) '
+                    'WHERE total - size < ?)',
+                    (size - int(self._max_size * keep),),
+                )
@@ -0,0 +1,40 @@
+from django.db.backends.sqlite3 import base
+
+# Значения по умолчанию; переопределяются OPTIONS['pragmas']
+PRAGMAS = {
+    # Читатели не блокируют писателя и наоборот
+    'journal_mode': 'WAL',
+    # В режиме WAL безопасно: теряются только последние транзакции
+    # при отключении питания, но не целостность базы
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - размер в килобайтах
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с настроенными прагмами и транзакциями BEGIN IMMEDIATE.
+
+    Транзакция, начатая обычным BEGIN, получает блокировку записи
+    только при первой записи; если её уже держит другое соединение,
+    SQLite сразу отвечает «database is locked», не дожидаясь
+    busy_timeout. BEGIN IMMEDIATE берёт блокировку в начале
+    транзакции и ждёт её.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **kwargs.pop('pragmas', {})}
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
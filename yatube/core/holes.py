@@ -0,0 +1,52 @@
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Метка «дырки» в закэшированной странице. Пользовательский текст
+# экранируется шаблонами, поэтому подделать метку в нём нельзя.
+HOLE_RE = re.compile(rb'<!--hole:(?P<name>[\w-]+)\?(?P<params>[^>]*?)-->')
+
+HOLES = {}
+
+
+def register_hole(name):
+    """Регистрирует функцию (request, **params) -> HTML для {% hole %}."""
+    def decorator(render):
+        HOLES[name] = render
+        return render
+    return decorator
+
+
+def render_hole(request, name, params):
+    return mark_safe(HOLES[name](request, **params))
+
+
+def hole_marker(name, params):
+    return mark_safe(f'<!--hole:{name}?{urlencode(params)}-->')
+
+
+def punch_holes(request):
+    """Дальше по запросу {% hole %} выводит метки вместо фрагментов."""
+    request.punch_holes = True
+
+
+def fill_holes(request, response):
+    """Подставляет в ответ фрагменты, отрисованные для этого запроса."""
+    if response.streaming or b'<!--hole:' not in response.content:
+        return response
+
+    def fill(match):
+        params = dict(parse_qsl(match['params'].decode()))
+        return render_hole(request, match['name'].decode(), params).encode()
+
+    response.content = HOLE_RE.sub(fill, response.content)
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = str(len(response.content))
+    return response
+
+
+@register_hole('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
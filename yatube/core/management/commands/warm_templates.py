@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.template_loaders import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает все шаблоны проекта: проверка перед выкладкой '
+        'и замер времени разбора'
+    )
+
+    def handle(self, *args, **options):
+        count, seconds = warm_up()
+        self.stdout.write(
+            f'Шаблонов разобрано: {count} за {seconds * 1000:.1f} мс'
+        )
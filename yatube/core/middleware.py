@@ -0,0 +1,113 @@
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('yatube.query_budget')
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        return {
+            sql: number
+            for sql, number in self.statements.items()
+            if number >= threshold
+        }
+
+
+def record_template_render(duration):
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.template_time += duration
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы и время рендеринга каждого запроса.
+
+    Результаты отдаются заголовком Server-Timing и пишутся в лог
+    yatube.query_budget. Превышение бюджета из QUERY_BUDGETS
+    (по имени представления) и повторы одного запроса
+    QUERY_DUPLICATE_THRESHOLD и более раз (признак N+1) записываются
+    как предупреждение; при QUERY_BUDGET_STRICT превышение бюджета
+    вызывает QueryBudgetExceeded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        total_time = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.sql_time * 1000:.1f};'
+            f'desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ))
+        self.report(request, metrics, total_time)
+        return response
+
+    def report(self, request, metrics, total_time):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(
+            view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        )
+        duplicates = metrics.duplicates(
+            getattr(settings, 'QUERY_DUPLICATE_THRESHOLD', 3)
+        )
+        record = {
+            'view': view_name,
+            'path': request.path,
+            'queries': metrics.queries,
+            'budget': budget,
+            'sql_ms': round(metrics.sql_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            'duplicates': duplicates,
+        }
+        over_budget = budget is not None and metrics.queries > budget
+        if not over_budget and not duplicates:
+            logger.info(json.dumps(record, ensure_ascii=False))
+            return
+        logger.warning(json.dumps(record, ensure_ascii=False))
+        if over_budget and getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(
+                f'{view_name} ({request.path}): {metrics.queries} queries '
+                f'exceed budget {budget}'
+            )
@@ -0,0 +1,79 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_read_replicas = contextvars.ContextVar('read_replicas', default=False)
+_wrote = contextvars.ContextVar('wrote', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def reading_replicas():
+    """Читает ли текущий запрос из реплик."""
+    return bool(_read_replicas.get() and replicas())
+
+
+class PrimaryReplicaRouter:
+    """Записи - в основную базу, чтения - в реплику из
+    DATABASE_REPLICAS, если ReplicaMiddleware разрешила это запросу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_replicas():
+            return random.choice(replicas())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if replicas():
+            wrote = _wrote.get()
+            if wrote is not None:
+                wrote.append(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии основной базы
+        return True
+
+
+class ReplicaMiddleware:
+    """Направляет чтения представлений из REPLICA_READ_VIEWS в реплики.
+
+    После запроса, записавшего в базу, клиент получает cookie и
+    REPLICA_PIN_SECONDS читает из основной базы, видя свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote = []
+        wrote_token = _wrote.set(wrote)
+        try:
+            response = self.get_response(request)
+        finally:
+            _wrote.reset(wrote_token)
+            replicas_token = getattr(request, '_read_replicas_token', None)
+            if replicas_token is not None:
+                _read_replicas.reset(replicas_token)
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            replicas()
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.view_name
+            in settings.REPLICA_READ_VIEWS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            request._read_replicas_token = _read_replicas.set(True)
@@ -0,0 +1,84 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - SHA-256 его содержимого.
+
+    Одинаковые файлы хранятся один раз: posts/ab/abcd....jpg, где posts/ -
+    каталог из upload_to. Содержимое файла под именем никогда не меняется,
+    поэтому его адрес можно кэшировать навсегда. Файл может быть общим
+    для нескольких объектов: удалять его можно, только когда на него
+    никто не ссылается.
+
+    Повторная загрузка существующего файла обновляет время его
+    изменения под блокировкой locked(): удаляющий процесс по нему видит,
+    что файл снова нужен, хотя ссылка на него ещё не сохранена.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(
+            self.content_name(name, content), content, max_length
+        )
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        _, extension = os.path.splitext(filename)
+        return os.path.join(
+            directory, digest[:2], f'{digest}{extension.lower()}'
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя означает то же содержимое
+        return name
+
+    @contextmanager
+    def locked(self, name):
+        """Блокировка между процессами для каталога файла name."""
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        descriptor = os.open(directory, os.O_RDONLY)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Закрытие дескриптора снимает блокировку
+            os.close(descriptor)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        with self.locked(name):
+            if os.path.exists(full_path):
+                os.utime(full_path)
+                return name.replace('\\', '/')
+        directory = os.path.dirname(full_path)
+        # Файл пишется под временным именем и атомарно переименовывается:
+        # одновременные загрузки одного файла пишут одно и то же
+        with tempfile.NamedTemporaryFile(
+            dir=directory, delete=False
+        ) as temporary:
+            try:
+                for chunk in content.chunks():
+                    temporary.write(chunk)
+            except BaseException:
+                os.remove(temporary.name)
+                raise
+        os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+        os.replace(temporary.name, full_path)
+        return name.replace('\\', '/')
@@ -0,0 +1,74 @@
+import re
+import time
+from pathlib import Path
+
+from django.template import TemplateDoesNotExist, engines
+from django.template.loaders import filesystem
+
+INCLUDE_RE = re.compile(
+    r'{%\s*include\s+(?P<quote>[\'"])(?P<name>[^\'"]+)(?P=quote)'
+    r'(?P<extra>(?:\s+with\s+[^%]*?)?)\s*%}'
+)
+# Шаблоны с наследованием нельзя вставлять в чужой текст
+NOT_INLINABLE_RE = re.compile(r'{%\s*(?:extends|block)\b')
+
+
+class FlatteningLoader(filesystem.Loader):
+    """Загрузчик, подставляющий текст статических {% include %}.
+
+    Вставляются только включения с именем-строкой и без only;
+    аргументы with превращаются в блок {% with %}. Вложенный шаблон
+    разбирается вместе с родительским, и при рендеринге не нужно
+    искать и выполнять отдельный шаблон для каждого включения.
+    """
+
+    def get_contents(self, origin):
+        return self.flatten(super().get_contents(origin), {origin.name})
+
+    def read(self, template_name):
+        for origin in self.get_template_sources(template_name):
+            try:
+                return super().get_contents(origin)
+            except TemplateDoesNotExist:
+                continue
+        return None
+
+    def flatten(self, contents, seen):
+        def inline(match):
+            name = match['name']
+            extra = match['extra'].strip()
+            if name in seen or 'only' in extra.split():
+                return match[0]
+            source = self.read(name)
+            if source is None or NOT_INLINABLE_RE.search(source):
+                return match[0]
+            source = self.flatten(source, seen | {name})
+            if extra:
+                return f'{{% {extra} %}}{source}{{% endwith %}}'
+            return source
+
+        return INCLUDE_RE.sub(inline, contents)
+
+
+def template_names(directory):
+    directory = Path(directory)
+    for path in sorted(directory.rglob('*.html')):
+        yield path.relative_to(directory).as_posix()
+
+
+def warm_up():
+    """Разбирает все шаблоны из DIRS, заполняя кэш загрузчика.
+
+    Возвращает число шаблонов и время в секундах.
+    """
+    start = time.perf_counter()
+    count = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for directory in engine.dirs:
+            for name in template_names(directory):
+                engine.get_template(name)
+                count += 1
+    return count, time.perf_counter() - start
@@ -0,0 +1,20 @@
+from django import template
+
+from core.holes import hole_marker, render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Фрагмент, зависящий от пользователя.
+
+    На страницах, кэшируемых целиком, выводит метку, которую
+    core.holes.fill_holes заменяет при каждом запросе; на остальных
+    страницах сразу рисует фрагмент.
+    """
+    params = {key: str(value) for key, value in params.items()}
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return hole_marker(name, params)
+    return render_hole(request, name, params)
@@ -0,0 +1,14 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_string(context, **kwargs):
+    """Текущие GET-параметры с заменой переданных; None удаляет параметр."""
+    params = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        params.pop(key, None)
+        if value is not None:
+            params[key] = value
+    return params.urlencode()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+from multiprocessing import get_context
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+def incr_in_child(path):
+    SQLiteCache(path, {}).incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_basic_operations(self):
+        """Запись, чтение, add, incr, удаление и срок жизни"""
+        cache = self.cache
+        cache.set('key', {'value': 1})
+        cache.set_many({'a': 1, 'b': 2}, timeout=None)
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertFalse(cache.add('a', 10))
+        self.assertTrue(cache.add('c', 3))
+        self.assertEqual(cache.incr('c', 2), 5)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.delete('a')
+        cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('expired'))
+        self.assertTrue(cache.add('expired', 2))
+
+    def test_shared_between_processes(self):
+        """Изменения одного процесса видны другим"""
+        self.cache.set('counter', 0)
+        processes = [
+            get_context('fork').Process(
+                target=incr_in_child, args=(self.path,)
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get('counter'), 4)
+
+    def test_lru_eviction(self):
+        """При превышении пределов вытесняются давно не читанные ключи"""
+        cache = SQLiteCache(self.path, {
+            'OPTIONS': {
+                'MAX_ENTRIES': 10,
+                'CULL_FREQUENCY': 2,
+                'CULL_EVERY': 1,
+                'ACCESS_RESOLUTION': 0,
+            },
+        })
+        cache.set('hot', 'value')
+        for number in range(20):
+            cache.set(f'key{number}', number)
+            cache.get('hot')
+        self.assertEqual(cache.get('hot'), 'value')
+        self.assertIsNone(cache.get('key0'))
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{number}' for number in range(20)]
+        )), 10)
+
+
+class TestCacheLocationTest(SimpleTestCase):
+    def test_cache_is_per_run(self):
+        """Тесты пишут в свой временный файл, а не в кэш узла"""
+        directory = os.path.dirname(cache._path)
+        self.assertTrue(
+            os.path.basename(directory).startswith('yatube-test-cache-')
+        )
@@ -0,0 +1,24 @@
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+
+class SQLiteBackendTest(TransactionTestCase):
+    def test_pragmas(self):
+        """Соединение получает прагмы из core.db.sqlite3"""
+        with connection.cursor() as cursor:
+            for pragma, expected in (
+                ('synchronous', 1),
+                ('busy_timeout', 20000),
+                ('cache_size', -64 * 1024),
+            ):
+                with self.subTest(pragma=pragma):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+    def test_transactions_begin_immediate(self):
+        """Транзакция сразу берёт блокировку записи"""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
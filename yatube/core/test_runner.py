@@ -0,0 +1,40 @@
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_caches():
+    """Кэши из settings.CACHES в файлах временного каталога.
+
+    Кэш из settings.CACHES общий для процессов узла: тесты не должны
+    читать его страницы и версии и очищать его у работающего сайта.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-test-cache-')
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, params in caches.items():
+        params['LOCATION'] = os.path.join(directory, f'{alias}.sqlite3')
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """Тесты с отдельными файлами кэша на каждый прогон."""
+
+    def setup_test_environment(self, **kwargs):
+        self.cache_stack = ExitStack()
+        self.cache_stack.enter_context(temporary_caches())
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.cache_stack.close()
@@ -1,10 +1,18 @@
 from django.contrib import admin
+from . import fts
 from .models import Group, Post, Comment
 
 DEFAULT_FIELD_VALUE = '-пусто-'
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return fts.search(queryset, search_term), False
+
+
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -18,7 +26,7 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = DEFAULT_FIELD_VALUE
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'text',
         'post',
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from itertools import islice
+
+BATCH_SIZE = 5000
+
+
+def batched(objects, size=BATCH_SIZE):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_create(model, objects, size=BATCH_SIZE, **kwargs):
+    """bulk_create по частям, не собирая все объекты в памяти."""
+    for batch in batched(objects, size):
+        model.objects.bulk_create(batch, **kwargs)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задавать даты полям с auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
@@ -0,0 +1,258 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+from core.holes import fill_holes, punch_holes
+from core.routers import reading_replicas, replicas
+
+VERSION_KEY_PREFIX = 'posts:version:'
+WRITTEN_KEY_PREFIX = 'posts:written:'
+# Версия области, изменённой позже возможного отставания реплики
+REPLICA_VERSION_SUFFIX = 'r'
+PAGE_KEY_PREFIX = 'posts:page:'
+# Сколько после истечения хранится устаревшее значение,
+# которое отдаётся, пока другой процесс вычисляет новое
+STALE_TIMEOUT = 60 * 60
+# Время жизни блокировки вычисления на случай падения процесса
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+# Коэффициент вероятностного раннего истечения (XFetch):
+# чем больше, тем раньше пересчитывается значение
+EARLY_EXPIRATION_BETA = 1.0
+
+
+def _version_key(scope):
+    return f'{VERSION_KEY_PREFIX}{scope}'
+
+
+def _written_key(scope):
+    return f'{WRITTEN_KEY_PREFIX}{scope}'
+
+
+def _new_version():
+    # Версия из времени не совпадает с версиями, вытесненными из кэша,
+    # поэтому старые страницы не могут ожить после потери счётчика.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """Версии областей данных для ключей кэша.
+
+    Если запрос читает из реплики, а область менялась за последние
+    REPLICA_LAG секунд, реплика могла ещё не получить изменение.
+    Такая версия получает суффикс: построенное из реплики не попадает
+    в кэш под версией основной базы.
+    """
+    keys = [_version_key(scope) for scope in scopes]
+    written_keys = []
+    if reading_replicas():
+        written_keys = [_written_key(scope) for scope in scopes]
+    versions = cache.get_many(keys + written_keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    result = [versions[key] for key in keys]
+    for index, key in enumerate(written_keys):
+        if key in versions:
+            result[index] = f'{result[index]}{REPLICA_VERSION_SUFFIX}'
+    return result
+
+
+def bump_versions(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+    if replicas():
+        cache.set_many(
+            {_written_key(scope): True for scope in scopes},
+            settings.REPLICA_LAG,
+        )
+
+
+def bump_versions_on_commit(*scopes):
+    """Повышает версии после фиксации текущей транзакции.
+
+    Параллельный запрос может увидеть версию, повышенную внутри
+    транзакции, раньше новых данных и закэшировать под ней страницу
+    из старого снимка базы; повышение после фиксации делает такую
+    страницу недоступной. Внутри транзакции версии тоже повышаются,
+    чтобы её собственные запросы видели изменения.
+    """
+    if transaction.get_connection().in_atomic_block:
+        bump_versions(*scopes)
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+def post_scopes(post_id, username, group_slug=None):
+    """Области данных страниц и карточки, на которых показан пост."""
+    scopes = [
+        'posts',
+        f'post:{post_id}',
+        f'card:{post_id}',
+        f'profile:{username}',
+    ]
+    if group_slug:
+        scopes.append(f'group:{group_slug}')
+    return scopes
+
+
+def attach_card_versions(posts):
+    """Добавляет постам версию карточки для кэша фрагментов post.html.
+
+    Карточка зависит от самого поста, от названий групп и от имени
+    автора.
+    """
+    posts = list(posts)
+    groups_version, *versions = get_versions(
+        ['groups']
+        + [f'author:{post.author_id}' for post in posts]
+        + [f'card:{post.pk}' for post in posts]
+    )
+    author_versions = versions[:len(posts)]
+    card_versions = versions[len(posts):]
+    for post, author_version, version in zip(
+        posts, author_versions, card_versions
+    ):
+        post.card_version = f'{groups_version}.{author_version}.{version}'
+    return posts
+
+
+def _expires_early(expires, delta, beta):
+    # Чем дольше вычисление и ближе срок, тем вероятнее пересчёт
+    return time.time() - delta * beta * math.log(random.random()) >= expires
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cache_get_or_set(key, compute, timeout, stale_key=None,
+                     should_cache=bool, beta=EARLY_EXPIRATION_BETA):
+    """Значение из кэша; вычисляет его не больше одного процесса сразу.
+
+    Значение пересчитывается немного раньше срока с вероятностью,
+    растущей к его концу. Пока один процесс держит блокировку
+    вычисления, остальные получают устаревшее значение из key или
+    stale_key, а если его нет - ждут результата до LOCK_WAIT секунд.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if not _expires_early(expires, delta, beta):
+            return value
+    elif stale_key is not None:
+        entry = cache.get(stale_key)
+    lock_key = f'{key}:lock'
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        if entry is None:
+            entry = _wait_for(key)
+        if entry is not None:
+            return entry[0]
+    try:
+        start = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - start
+        if should_cache(value):
+            entry = (value, time.time() + timeout, delta)
+            keys = (key,) if stale_key is None else (key, stale_key)
+            cache.set_many(
+                dict.fromkeys(keys, entry), timeout + STALE_TIMEOUT
+            )
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def _cacheable_page(page):
+    _, response = page
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def page_etag(request, key_prefix):
+    """Слабый ETag страницы: версии её данных, адрес и пользователь.
+
+    Фрагменты {% hole %} зависят от пользователя, поэтому он входит
+    в ETag; тело отличается токеном CSRF, отсюда слабое сравнение.
+    """
+    user = request.user.pk if request.user.is_authenticated else ''
+    digest = hashlib.md5(
+        f'{key_prefix}:{request.get_full_path()}:{user}'.encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_page_versioned(timeout, get_scopes):
+    """Кэширует страницу под ключом, зависящим от версий её данных.
+
+    get_scopes получает именованные аргументы представления и возвращает
+    области данных страницы; сигналы моделей повышают версии областей,
+    и закэшированная страница перестаёт использоваться.
+
+    В кэш попадает страница, общая для всех посетителей: фрагменты
+    {% hole %} хранятся метками и отрисовываются для каждого запроса.
+
+    Ответ получает ETag из тех же версий; запрос с совпадающим
+    If-None-Match получает 304 без рендеринга и обращения к кэшу страниц.
+    Браузер должен перепроверять страницу при каждом показе.
+
+    Страница строится через cache_get_or_set: после изменения данных,
+    пока один процесс её перестраивает, остальные отдают прежнюю.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = get_scopes(**kwargs)
+            versions = '.'.join(map(str, get_versions(scopes)))
+            key_prefix = f'{view.__name__}:{versions}'
+
+            @condition(etag_func=lambda request, *args, **kwargs: page_etag(
+                request, key_prefix
+            ))
+            def conditional_view(request, *args, **kwargs):
+                punch_holes(request)
+                if request.method not in ('GET', 'HEAD'):
+                    return fill_holes(request, view(request, *args, **kwargs))
+                url = hashlib.md5(
+                    request.build_absolute_uri().encode()
+                ).hexdigest()
+                page_prefix, response = cache_get_or_set(
+                    f'{PAGE_KEY_PREFIX}{key_prefix}:{url}',
+                    lambda: (key_prefix, view(request, *args, **kwargs)),
+                    timeout,
+                    stale_key=f'{PAGE_KEY_PREFIX}{view.__name__}:{url}',
+                    should_cache=_cacheable_page,
+                )
+                if page_prefix != key_prefix:
+                    # Прежняя версия страницы отдаётся со своим ETag
+                    response['ETag'] = page_etag(request, page_prefix)
+                response = fill_holes(request, response)
+                response['Cache-Control'] = 'private, no-cache'
+                return response
+
+            return conditional_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
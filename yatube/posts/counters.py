@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserCounters
+
+TOTAL_POSTS_KEY = 'posts:total'
+
+
+def change_counter(queryset, field, delta):
+    value = F(field) + delta
+    if delta < 0:
+        # Разошедшийся с базой счётчик не уходит ниже нуля
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def change_user_counter(user_id, field, delta):
+    updated = change_counter(
+        UserCounters.objects.filter(user_id=user_id), field, delta
+    )
+    if not updated and delta > 0:
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def total_posts():
+    """Число всех постов для паджинатора главной страницы.
+
+    Считается один раз и дальше меняется сигналами постов;
+    recount_counters сбрасывает его.
+    """
+    total = cache.get(TOTAL_POSTS_KEY)
+    if total is None:
+        total = Post.objects.count()
+        cache.add(TOTAL_POSTS_KEY, total, None)
+    return total
+
+
+def change_total_posts(delta):
+    try:
+        cache.incr(TOTAL_POSTS_KEY, delta)
+    except ValueError:
+        # Ещё не посчитано: total_posts посчитает по базе
+        pass
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def recount_users(users):
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(user_id=user_id)
+            for user_id in users.filter(counters__isnull=True).values_list(
+                'pk', flat=True
+            )
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    UserCounters.objects.filter(user__in=users.values('pk')).update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def recount_counters():
+    """Пересчитывает все денормализованные счётчики по базе."""
+    Group.objects.update(posts_count=_count(Post.objects.all(), 'group'))
+    Post.objects.update(
+        comments_count=_count(Comment.objects.all(), 'post')
+    )
+    recount_users(User.objects.all())
+    cache.delete(TOTAL_POSTS_KEY)
@@ -1,4 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+
+from .images import EMPTY_IMAGE_FIELDS, describe_image, shrink_image
 from .models import Post, Comment
 
 
@@ -7,6 +12,42 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Пределы на размер файла и число пикселей картинки.
+
+        ImageField к этому моменту прочитал только заголовок картинки;
+        принятая картинка уменьшается и очищается от EXIF.
+        """
+        image = self.cleaned_data['image']
+        if not getattr(image, 'image', None):
+            # Картинка не менялась
+            return image
+        if image.size > settings.POST_IMAGE_MAX_BYTES:
+            raise ValidationError(
+                'Файл больше %s' % filesizeformat(
+                    settings.POST_IMAGE_MAX_BYTES
+                ),
+                code='file_too_large',
+            )
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Картинка {width}x{height} слишком большая',
+                code='too_many_pixels',
+            )
+        return shrink_image(image)
+
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            # Варианты новой картинки создаст process_thumbnails
+            image = self.cleaned_data['image']
+            fields = {**EMPTY_IMAGE_FIELDS}
+            if image:
+                fields.update(describe_image(image))
+            for field, value in fields.items():
+                setattr(self.instance, field, value)
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,92 @@
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+# Таблицы, текст которых индексируется полнотекстовым индексом SQLite FTS5.
+# Индекс хранит только токены (external content), а сам текст читается
+# из исходной таблицы; синхронизацию выполняют триггеры.
+FTS_TABLES = (
+    ('posts_post', 'text'),
+    ('posts_comment', 'text'),
+)
+
+
+def _fts_table(table):
+    return f'{table}_fts'
+
+
+def _install_statements(table, column):
+    fts = _fts_table(table)
+    insert = (
+        f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column});'
+    )
+    delete = (
+        f"INSERT INTO {fts}({fts}, rowid, {column}) "
+        f"VALUES ('delete', old.id, old.{column});"
+    )
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f'DROP TRIGGER IF EXISTS {fts}_ai',
+        f'DROP TRIGGER IF EXISTS {fts}_ad',
+        f'DROP TRIGGER IF EXISTS {fts}_au',
+        f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+        f'{insert} END',
+        f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+        f'{delete} END',
+        f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN '
+        f'{delete} {insert} END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    )
+
+
+def install(apps, schema_editor):
+    """Создаёт индексы и триггеры и перестраивает индексы.
+
+    Операция идемпотентна. SQLite удаляет триггеры при пересоздании
+    таблицы, поэтому миграции, пересоздающие posts_post или posts_comment,
+    должны вызывать её повторно.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, column in FTS_TABLES:
+        for statement in _install_statements(table, column):
+            schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, column in FTS_TABLES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {_fts_table(table)}')
+
+
+def match_expression(text):
+    """Превращает ввод пользователя в запрос FTS5: все слова обязательны,
+    последнее слово ищется по префиксу.
+    """
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in text.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(queryset, text):
+    """Фильтрует queryset по вхождению слов text в индексируемое поле."""
+    terms = text.split()
+    if not terms:
+        return queryset.none()
+    model = queryset.model
+    table = model._meta.db_table
+    column = dict(FTS_TABLES)[table]
+    if connections[queryset.db].vendor != 'sqlite':
+        for term in terms:
+            queryset = queryset.filter(**{f'{column}__icontains': term})
+        return queryset
+    fts = _fts_table(table)
+    return queryset.filter(
+        id__in=RawSQL(
+            f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s',
+            (match_expression(text),),
+        )
+    )
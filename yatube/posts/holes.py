@@ -0,0 +1,52 @@
+from django.template.loader import render_to_string
+
+from core.holes import register_hole
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@register_hole('switcher')
+def switcher(request):
+    return render_to_string(
+        'posts/includes/switcher.html', request=request
+    )
+
+
+@register_hole('follow_button')
+def follow_button(request, author_id, username):
+    user = request.user
+    context = {
+        'username': username,
+        'myself': user.is_authenticated and str(user.id) == author_id,
+        'following': None,
+    }
+    if user.is_authenticated:
+        context['following'] = Follow.objects.filter(
+            user=user, author_id=author_id
+        ).exists()
+    return render_to_string(
+        'posts/includes/follow_button.html', context, request=request
+    )
+
+
+@register_hole('post_edit_button')
+def post_edit_button(request, post_id, author_id):
+    context = {
+        'post_id': post_id,
+        'is_author': str(request.user.id) == author_id,
+    }
+    return render_to_string(
+        'posts/includes/post_edit_button.html', context, request=request
+    )
+
+
+@register_hole('comment_form')
+def comment_form(request, post_id):
+    context = {
+        'post_id': post_id,
+        'form': CommentForm(),
+    }
+    return render_to_string(
+        'posts/includes/comment_form.html', context, request=request
+    )
@@ -0,0 +1,93 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, которые сохраняются как есть; остальные - в PNG
+KEPT_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif'}
+JPEG_QUALITY = 85
+# Размер, до которого уменьшается картинка для подсчёта среднего цвета
+COLOR_SAMPLE_SIZE = 64
+# Значения EXIF Orientation, при которых картинка поворачивается на 90°
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+EMPTY_IMAGE_FIELDS = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_variants': '',
+}
+
+
+def needs_processing(image, max_side):
+    """Нужно ли перекодировать картинку: она больше max_side
+    или несёт метаданные EXIF (координаты, модель камеры, поворот).
+    """
+    return (
+        max(image.size) > max_side
+        or image.format not in KEPT_FORMATS
+        or bool(image.getexif())
+    )
+
+
+def shrink_image(upload, max_side=None):
+    """Уменьшает загруженную картинку до max_side и удаляет EXIF.
+
+    JPEG декодируется сразу в уменьшенном масштабе (draft) и целиком
+    в память не попадает; остальные форматы декодируются полностью
+    и уменьшаются через reduce. Результат пишется во временный файл,
+    который до FILE_UPLOAD_MAX_MEMORY_SIZE держится в памяти.
+    Картинки, которые менять не нужно, возвращаются без изменений.
+    """
+    max_side = max_side or settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if not needs_processing(image, max_side):
+            upload.seek(0)
+            return upload
+        image_format = (
+            image.format if image.format in KEPT_FORMATS else 'PNG'
+        )
+        image.draft('RGB', (max_side, max_side))
+        image.thumbnail((max_side, max_side), reducing_gap=2.0)
+        # Поворот из EXIF применяется к пикселям, раз EXIF удаляется;
+        # после уменьшения копия картинки занимает меньше памяти
+        image = ImageOps.exif_transpose(image)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        name, _ = os.path.splitext(os.path.basename(upload.name))
+        output = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        options = (
+            {'quality': JPEG_QUALITY, 'optimize': True}
+            if image_format == 'JPEG' else {}
+        )
+        image.save(output, format=image_format, **options)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(
+        output,
+        f'{name}{KEPT_FORMATS[image_format]}',
+        Image.MIME[image_format],
+        size,
+    )
+
+
+def describe_image(file):
+    """Поля Post со сведениями о картинке: размеры и средний цвет."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        image.draft('RGB', (COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+        image.thumbnail((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE))
+        red, green, blue = image.convert('RGB').resize(
+            (1, 1), Image.BOX
+        ).getpixel((0, 0))
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+    }
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь миниатюры для всех картинок постов'
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).iterator()
+        enqueue(names)
+        self.stdout.write(
+            'Картинки поставлены в очередь, запустите process_thumbnails'
+        )
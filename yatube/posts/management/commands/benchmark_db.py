@@ -0,0 +1,105 @@
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import OperationalError, connections, transaction
+
+from posts.models import Comment, Post, User
+
+BENCHMARK_TEXT = 'benchmark_db'
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else None
+    return round(statistics.quantiles(values, n=100)[percent - 1], 2)
+
+
+def _read(rng, paginator):
+    page = paginator.page(rng.randint(1, min(paginator.num_pages, 20)))
+    list(page)
+
+
+def _write(rng, post_ids, user_ids):
+    with transaction.atomic():
+        Comment.objects.create(
+            text=BENCHMARK_TEXT,
+            post_id=rng.choice(post_ids),
+            author_id=rng.choice(user_ids),
+        )
+
+
+def _worker(seed, seconds, write_ratio):
+    rng = random.Random(seed)
+    post_ids = list(Post.objects.values_list('id', flat=True)[:1000])
+    user_ids = list(User.objects.values_list('id', flat=True)[:1000])
+    paginator = Paginator(
+        Post.objects.select_related('author', 'group').order_by('-pub_date'),
+        10,
+    )
+    timings = {'read': [], 'write': []}
+    errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        start = time.monotonic()
+        try:
+            if kind == 'write':
+                _write(rng, post_ids, user_ids)
+            else:
+                _read(rng, paginator)
+        except OperationalError:
+            errors += 1
+            continue
+        timings[kind].append((time.monotonic() - start) * 1000)
+    connections.close_all()
+    return timings, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка чтения и записи на базу из нескольких '
+        'процессов. Печатает JSON с числом операций в секунду, '
+        'задержками и ошибками «database is locked». '
+        'Созданные комментарии удаляются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            self.stderr.write('Нет данных, сначала запустите generate_data')
+            return
+        # Соединения с БД не должны наследоваться дочерними процессами
+        connections.close_all()
+        workers = options['workers']
+        with ProcessPoolExecutor(
+            workers, mp_context=get_context('fork')
+        ) as executor:
+            results = list(executor.map(
+                _worker,
+                range(workers),
+                [options['seconds']] * workers,
+                [options['write_ratio']] * workers,
+            ))
+        report = {'errors': sum(errors for _, errors in results)}
+        for kind in ('read', 'write'):
+            timings = [
+                timing for worker_timings, _ in results
+                for timing in worker_timings[kind]
+            ]
+            report[kind] = {
+                'ops_per_second': round(len(timings) / options['seconds'], 1),
+                'p50_ms': _percentile(timings, 50),
+                'p95_ms': _percentile(timings, 95),
+            }
+        Comment.objects.filter(text=BENCHMARK_TEXT).delete()
+        self.stdout.write(json.dumps(report, indent=2))
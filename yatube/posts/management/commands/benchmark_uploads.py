@@ -0,0 +1,93 @@
+import json
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.forms import PostForm
+
+# Размеры и форматы тестовых картинок: фото с камеры и скриншот
+IMAGES = (
+    ('photo.jpg', 'JPEG', (6000, 4000)),
+    ('screenshot.png', 'PNG', (3840, 2160)),
+)
+
+
+def _make_image(directory, name, image_format, size):
+    path = os.path.join(directory, name)
+    # Градиент, чтобы файл не сжимался до нескольких байт
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    exif = Image.Exif()
+    exif[0x0110] = 'benchmark camera'
+    image.save(path, image_format, exif=exif)
+    return path
+
+
+def _upload(path):
+    upload = TemporaryUploadedFile(
+        os.path.basename(path), None, os.path.getsize(path), None
+    )
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            upload.write(chunk)
+    upload.seek(0)
+    return upload
+
+
+def _decode(path):
+    # Так обрабатывалась картинка без draft и reduce
+    with Image.open(path) as image:
+        image.load()
+        image.thumbnail((1920, 1920))
+
+
+def _validate(path):
+    form = PostForm(
+        data={'text': 'benchmark_uploads'},
+        files={'image': _upload(path)},
+    )
+    if not form.is_valid():
+        raise ValueError(form.errors.as_text())
+    form.cleaned_data['image'].close()
+
+
+def _measure(mode, path):
+    # Каждый замер - в отдельном процессе, чтобы пик памяти был своим
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.monotonic()
+    {'decode': _decode, 'validate': _validate}[mode](path)
+    elapsed = time.monotonic() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'ms': round(elapsed * 1000, 1),
+        'peak_rss_mb': round((after - before) / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает полное декодирование больших картинок с проверкой '
+        'PostForm: время и прирост пикового RSS процесса. '
+        'Печатает JSON.'
+    )
+
+    def handle(self, *args, **options):
+        report = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, image_format, size in IMAGES:
+                path = _make_image(directory, name, image_format, size)
+                report[name] = {'bytes': os.path.getsize(path)}
+                for mode in ('decode', 'validate'):
+                    with ProcessPoolExecutor(
+                        1, mp_context=get_context('fork')
+                    ) as executor:
+                        report[name][mode] = executor.submit(
+                            _measure, mode, path
+                        ).result()
+        self.stdout.write(json.dumps(report, indent=2))
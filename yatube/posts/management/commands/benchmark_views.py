@@ -0,0 +1,115 @@
+import json
+import re
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100)[percent - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер представлений posts через тестовый клиент. '
+        'Печатает JSON с p50/p95/p99 задержки, числом SQL-запросов '
+        'и пропускной способностью по каждому сценарию. '
+        'Сценарии записи изменяют данные в базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--no-writes', action='store_true',
+            help='Не запускать сценарии записи',
+        )
+        parser.add_argument('--output', help='Файл для JSON-результата')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='benchmark')
+        author = User.objects.order_by('-counters__followers_count').first()
+        group = Group.objects.order_by('-posts_count').first()
+        post = Post.objects.order_by('-comments_count').first()
+        if not (author and group and post):
+            self.stderr.write('Нет данных, сначала запустите generate_data')
+            return
+        Follow.objects.get_or_create(user=user, author=author)
+        guest = Client(HTTP_HOST='localhost')
+        member = Client(HTTP_HOST='localhost')
+        member.force_login(user)
+        deep_page = max(Post.objects.count() // 20, 1)
+
+        scenarios = [
+            ('index', guest, 'get', reverse('posts:index'), None),
+            ('index deep page', guest, 'get',
+             reverse('posts:index') + f'?page={deep_page}', None),
+            ('group_list', guest, 'get',
+             reverse('posts:group_list', args=(group.slug,)), None),
+            ('profile', member, 'get',
+             reverse('posts:profile', args=(author.username,)), None),
+            ('post_detail', member, 'get',
+             reverse('posts:post_detail', args=(post.id,)), None),
+            ('follow_index', member, 'get',
+             reverse('posts:follow_index'), None),
+        ]
+        if not options['no_writes']:
+            scenarios += [
+                ('post_create', member, 'post',
+                 reverse('posts:post_create'), {'text': 'benchmark'}),
+                ('add_comment', member, 'post',
+                 reverse('posts:add_comment', args=(post.id,)),
+                 {'text': 'benchmark'}),
+                ('profile_follow', member, 'get',
+                 reverse('posts:profile_follow', args=(author.username,)),
+                 None),
+            ]
+
+        results = {
+            name: self.run(client, method, url, data, options)
+            for name, client, method, url, data in scenarios
+        }
+        report = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        self.stdout.write(report)
+
+    def run(self, client, method, url, data, options):
+        durations = []
+        queries = []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            durations.append((time.perf_counter() - start) * 1000)
+            match = SERVER_TIMING_QUERIES.search(
+                response.get('Server-Timing', '')
+            )
+            if match:
+                queries.append(int(match.group(1)))
+        elapsed = time.perf_counter() - started
+        return {
+            'url': url,
+            'status': response.status_code,
+            'p50_ms': round(percentile(durations, 50), 2),
+            'p95_ms': round(percentile(durations, 95), 2),
+            'p99_ms': round(percentile(durations, 99), 2),
+            'queries': round(statistics.mean(queries), 1) if queries else None,
+            'rps': round(len(durations) / elapsed, 1),
+        }
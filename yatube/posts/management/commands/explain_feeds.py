@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Follow, Post, Timeline
+from posts.views import NUMBER_DISPLAYED_POSTS
+
+
+def feed_queries(user_id=1, author_id=1, group_id=1, post_id=1):
+    limit = NUMBER_DISPLAYED_POSTS
+    return (
+        (
+            'index',
+            Post.objects.order_by('-pub_date', '-id')[:limit],
+        ),
+        (
+            'posts by author',
+            Post.objects.filter(author_id=author_id).order_by(
+                '-pub_date', '-id'
+            )[:limit],
+        ),
+        (
+            'posts by group',
+            Post.objects.filter(group_id=group_id).order_by(
+                '-pub_date', '-id'
+            )[:limit],
+        ),
+        (
+            'comments by post',
+            Comment.objects.filter(post_id=post_id).order_by('-created'),
+        ),
+        (
+            'follow lookup',
+            Follow.objects.filter(user_id=user_id, author_id=author_id),
+        ),
+        (
+            'follow feed',
+            Timeline.objects.filter(user_id=user_id).order_by(
+                '-pub_date', '-post_id'
+            )[:limit],
+        ),
+    )
+
+
+def is_slow_plan(plan):
+    for line in plan.splitlines():
+        if 'TEMP B-TREE' in line:
+            return True
+        if 'SCAN' in line and 'USING' not in line:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает планы запросов лент (EXPLAIN QUERY PLAN). '
+        'Для сравнения запустите команду до и после миграции '
+        'posts 0005_feed_indexes.'
+    )
+
+    def add_arguments(self, parser):
+        for name in ('user', 'author', 'group', 'post'):
+            parser.add_argument(f'--{name}', type=int, default=1)
+
+    def handle(self, *args, **options):
+        queries = feed_queries(
+            user_id=options['user'],
+            author_id=options['author'],
+            group_id=options['group'],
+            post_id=options['post'],
+        )
+        for name, queryset in queries:
+            plan = queryset.explain()
+            if is_slow_plan(plan):
+                self.stdout.write(self.style.WARNING(f'{name}: scan/sort'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: index'))
+            self.stdout.write(plan)
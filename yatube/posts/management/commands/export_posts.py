@@ -0,0 +1,83 @@
+import os
+import shutil
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post, User
+
+# Порядок важен: объекты идут после тех, на кого ссылаются
+EXPORTED_FIELDS = (
+    ('user', User, (
+        'id', 'username', 'password', 'first_name', 'last_name', 'email',
+        'is_active', 'date_joined',
+    )),
+    ('group', Group, ('id', 'title', 'slug', 'description')),
+    ('post', Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+        'image_width', 'image_height', 'image_color',
+    )),
+    ('comment', Comment, ('id', 'text', 'created', 'post_id', 'author_id')),
+    ('follow', Follow, ('user_id', 'author_id')),
+)
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder отбрасывает микросекунды, а по дате
+        # публикации упорядочены ленты
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON: по объекту на строку, потоково, с постоянным '
+        'расходом памяти. Загрузка - import_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='Файл NDJSON, по умолчанию stdout',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог, куда скопировать картинки постов',
+        )
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options)
+        else:
+            with open(options['output'], 'w') as output:
+                self.export(output, options)
+
+    def export(self, output, options):
+        encoder = ExportEncoder(ensure_ascii=False)
+        for name, model, fields in EXPORTED_FIELDS:
+            rows = model.objects.order_by('pk').values(*fields).iterator(
+                chunk_size=options['chunk_size']
+            )
+            count = 0
+            for row in rows:
+                if name == 'post' and row['image'] and options['media_dir']:
+                    self.copy_image(row['image'], options['media_dir'])
+                output.write(encoder.encode({'model': name, **row}) + '\n')
+                count += 1
+            self.stderr.write(f'{name}: {count}')
+
+    def copy_image(self, name, media_dir):
+        path = os.path.join(media_dir, name)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Картинки лежат в хранилище поля, а не в default_storage
+        storage = Post._meta.get_field('image').storage
+        with storage.open(name) as source, open(path, 'wb') as copy:
+            shutil.copyfileobj(source, copy)
@@ -0,0 +1,158 @@
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import bulk_create, explicit_dates
+from posts.counters import recount_counters
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import enqueue
+from posts.timeline import rebuild_timeline
+
+WORDS = (
+    'лето', 'город', 'утро', 'дорога', 'книга', 'музыка', 'река', 'кофе',
+    'друг', 'поезд', 'снег', 'море', 'работа', 'вечер', 'кино', 'сад',
+    'python', 'django', 'код', 'идея', 'проект', 'фото', 'горы', 'дом',
+)
+
+
+def random_text(rng, words_min, words_max):
+    words = rng.choices(WORDS, k=rng.randint(words_min, words_max))
+    return ' '.join(words).capitalize() + '.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными: пользователи, группы, '
+        'подписки со степенным распределением популярности, посты, '
+        'комментарии и (по желанию) картинки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Число разных картинок, раздаваемых постам',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        period = timedelta(days=options['days']).total_seconds()
+
+        first_user = (User.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0) + 1
+        password = make_password(None)
+        bulk_create(User, (
+            User(username=f'user{first_user + i}', password=password)
+            for i in range(options['users'])
+        ))
+        user_ids = list(User.objects.values_list('id', flat=True))
+        # Популярность авторов распределена по Парето: немногие авторы
+        # собирают большую часть подписчиков, постов и комментариев.
+        popularity = [rng.paretovariate(1.2) for _ in user_ids]
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+
+        first_group = Group.objects.count() + 1
+        bulk_create(Group, (
+            Group(
+                title=f'Группа {first_group + i}',
+                slug=f'group-{first_group + i}',
+                description=random_text(rng, 5, 20),
+            )
+            for i in range(options['groups'])
+        ))
+        group_ids = list(Group.objects.values_list('id', flat=True))
+
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+        follows = []
+        for user_id in user_ids:
+            number = min(
+                int(rng.expovariate(1 / options['follows'])),
+                len(user_ids) - 1,
+            )
+            for author_id in rng.choices(user_ids, popularity, k=number):
+                pair = (user_id, author_id)
+                if author_id != user_id and pair not in existing:
+                    existing.add(pair)
+                    follows.append(
+                        Follow(user_id=user_id, author_id=author_id)
+                    )
+        bulk_create(Follow, follows)
+        self.stdout.write(f'Подписок: {len(follows)}')
+
+        images = [
+            self.create_image(rng, number)
+            for number in range(options['images'])
+        ]
+        with explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'),
+        ):
+            bulk_create(Post, (
+                Post(
+                    text=random_text(rng, 10, 80),
+                    author_id=author_id,
+                    group_id=(
+                        rng.choice(group_ids)
+                        if group_ids and rng.random() < 0.7 else None
+                    ),
+                    image=(
+                        rng.choice(images)
+                        if images and rng.random() < options['image_ratio']
+                        else ''
+                    ),
+                    pub_date=now - timedelta(seconds=rng.random() * period),
+                )
+                for author_id in rng.choices(
+                    user_ids, popularity, k=options['posts']
+                )
+            ))
+            self.stdout.write(f'Постов: {options["posts"]}')
+            post_ids = list(Post.objects.values_list('id', flat=True))
+            if post_ids:
+                bulk_create(Comment, (
+                    Comment(
+                        text=random_text(rng, 3, 30),
+                        author_id=rng.choice(user_ids),
+                        post_id=post_id,
+                        created=now - timedelta(
+                            seconds=rng.random() * period
+                        ),
+                    )
+                    for post_id in rng.choices(post_ids, k=options['comments'])
+                ))
+            self.stdout.write(f'Комментариев: {options["comments"]}')
+
+        rebuild_timeline()
+        recount_counters()
+        # Миниатюры создаст process_thumbnails
+        enqueue(images)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def create_image(self, rng, number):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1920, 1080), color).save(buffer, 'JPEG')
+        return Post.image.field.storage.save(
+            f'posts/generated_{number}.jpg', ContentFile(buffer.getvalue())
+        )
@@ -0,0 +1,178 @@
+import json
+import os
+import sys
+from itertools import groupby
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils._os import safe_join
+
+from posts.bulk import batched, explicit_dates
+from posts.caching import bump_versions
+from posts.counters import recount_counters
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import request_thumbnails
+from posts.timeline import rebuild_timeline
+
+
+def max_id(model):
+    return model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает NDJSON из export_posts пачками bulk_create. '
+        'Пользователи и группы сопоставляются по username и slug; '
+        'id постов и комментариев сдвигаются на максимальный id в базе, '
+        'поэтому ссылки пересчитываются без таблиц соответствия. '
+        'В памяти держатся только соответствия id пользователей и групп.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='Файл NDJSON, по умолчанию stdin',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог с картинками, выгруженными export_posts',
+        )
+
+    def handle(self, *args, **options):
+        self.media_dir = options['media_dir']
+        self.images = {}
+        self.user_ids = {}
+        self.group_ids = {}
+        self.next_user_id = max_id(User) + 1
+        self.next_group_id = max_id(Group) + 1
+        self.post_offset = max_id(Post)
+        self.comment_offset = max_id(Comment)
+        if options['input'] == '-':
+            self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['input']) as source:
+                self.load(source, options['batch_size'])
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), (User, Group, Post, Comment)
+            ):
+                cursor.execute(sql)
+        rebuild_timeline()
+        recount_counters()
+        for names in batched(
+            Post.objects.filter(id__gt=self.post_offset).exclude(
+                image=''
+            ).values_list('image', flat=True).iterator()
+        ):
+            # Такие картинки могут быть уже обработаны: варианты
+            # в поля новых постов запишет повторная обработка
+            request_thumbnails(*names)
+        # Версия групп входит в ключ каждой страницы и карточки
+        bump_versions('groups')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def load(self, source, batch_size):
+        records = (json.loads(line) for line in source if line.strip())
+        with explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'),
+        ):
+            for name, rows in groupby(records, key=lambda row: row['model']):
+                load_batch = getattr(self, f'load_{name}', None)
+                if load_batch is None:
+                    raise CommandError(f'Неизвестная модель: {name}')
+                count = 0
+                for batch in batched(rows, batch_size):
+                    load_batch(batch)
+                    count += len(batch)
+                self.stderr.write(f'{name}: {count}')
+
+    def load_user(self, rows):
+        existing = dict(User.objects.filter(
+            username__in=[row['username'] for row in rows]
+        ).values_list('username', 'id'))
+        users = []
+        for row in rows:
+            old_id = row.pop('id')
+            del row['model']
+            if row['username'] in existing:
+                self.user_ids[old_id] = existing[row['username']]
+                continue
+            self.user_ids[old_id] = self.next_user_id
+            users.append(User(id=self.next_user_id, **row))
+            self.next_user_id += 1
+        User.objects.bulk_create(users)
+
+    def load_group(self, rows):
+        existing = dict(Group.objects.filter(
+            slug__in=[row['slug'] for row in rows]
+        ).values_list('slug', 'id'))
+        groups = []
+        for row in rows:
+            old_id = row.pop('id')
+            del row['model']
+            if row['slug'] in existing:
+                self.group_ids[old_id] = existing[row['slug']]
+                continue
+            self.group_ids[old_id] = self.next_group_id
+            groups.append(Group(id=self.next_group_id, **row))
+            self.next_group_id += 1
+        Group.objects.bulk_create(groups)
+
+    def load_post(self, rows):
+        Post.objects.bulk_create(
+            Post(
+                id=row['id'] + self.post_offset,
+                text=row['text'],
+                pub_date=row['pub_date'],
+                author_id=self.user_ids[row['author_id']],
+                group_id=self.group_ids.get(row['group_id']),
+                image=self.copy_image(row['image']),
+                image_width=row['image_width'],
+                image_height=row['image_height'],
+                image_color=row['image_color'],
+            )
+            for row in rows
+        )
+
+    def load_comment(self, rows):
+        Comment.objects.bulk_create(
+            Comment(
+                id=row['id'] + self.comment_offset,
+                text=row['text'],
+                created=row['created'],
+                post_id=row['post_id'] + self.post_offset,
+                author_id=self.user_ids[row['author_id']],
+            )
+            for row in rows
+        )
+
+    def load_follow(self, rows):
+        Follow.objects.bulk_create(
+            (
+                Follow(
+                    user_id=self.user_ids[row['user_id']],
+                    author_id=self.user_ids[row['author_id']],
+                )
+                for row in rows
+            ),
+            ignore_conflicts=True,
+        )
+
+    def copy_image(self, name):
+        if not name or not self.media_dir:
+            return name
+        if name not in self.images:
+            path = safe_join(self.media_dir, name)
+            if not os.path.exists(path):
+                self.images[name] = name
+            else:
+                with open(path, 'rb') as image:
+                    self.images[name] = Post.image.field.storage.save(
+                        name, File(image)
+                    )
+        return self.images[name]
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import collect_released_images, process_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры картинок постов из очереди заданий '
+        'и удаляет освобождённые картинки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Число процессов; 0 - обработка в текущем процессе',
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новых заданий',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Пауза между проверками очереди в режиме --loop, секунд',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending(
+                options['workers'], options['batch_size']
+            )
+            if processed:
+                self.stdout.write(f'Обработано заданий: {processed}')
+            collected = collect_released_images()
+            if collected:
+                self.stdout.write(f'Удалено картинок: {collected}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
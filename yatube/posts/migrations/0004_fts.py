@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from posts import fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.install, fts.uninstall),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:28
+
+import core.storage
+from django.db import migrations, models
+
+from posts import fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_thumbnail_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        # SQLite пересоздаёт posts_post, а с ней и триггеры индекса
+        migrations.RunPython(fts.install, migrations.RunPython.noop),
+    ]
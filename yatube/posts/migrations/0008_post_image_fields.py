@@ -0,0 +1,53 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+from posts import fts
+
+
+def requeue_thumbnails(apps, schema_editor):
+    # Обработчик очереди заполнит новые поля для уже загруженных картинок
+    Post = apps.get_model('posts', 'Post')
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    names = Post.objects.exclude(image='').values_list(
+        'image', flat=True
+    ).distinct()
+    ThumbnailJob.objects.bulk_create(
+        (ThumbnailJob(image=name) for name in names.iterator()),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    ThumbnailJob.objects.update(status='pending', attempts=0, error='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, verbose_name='Варианты картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        # SQLite пересоздаёт posts_post, а с ней и триггеры индекса
+        migrations.RunPython(fts.install, migrations.RunPython.noop),
+        migrations.RunPython(requeue_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.19 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_image_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleasedImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=255, unique=True, verbose_name='Картинка')),
+                ('released', models.DateTimeField(db_index=True, verbose_name='Освобождена')),
+            ],
+            options={
+                'verbose_name': 'Освобождённая картинка',
+                'verbose_name_plural': 'Освобождённые картинки',
+                'ordering': ('released',),
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -21,6 +23,11 @@ class Group(models.Model):
         blank=True,
         null=True,
     )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self):
         return self.title
@@ -64,13 +71,56 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Сведения о картинке, чтобы шаблоны не обращались к хранилищу:
+    # размеры оригинала, средний цвет для заглушки и варианты миниатюр
+    # в JSON {формат: [[ширина, имя файла], ...]}. Варианты заполняет
+    # process_thumbnails.
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    image_color = models.CharField(
+        'Цвет картинки',
+        max_length=7,
+        blank=True,
+        editable=False,
+    )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', 'pub_date'),
+                name='post_group_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -111,6 +161,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -131,3 +187,134 @@ class Follow(models.Model):
         blank=False,
         null=False,
     )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
+
+class UserCounters(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_post',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        )
+
+
+class ThumbnailJob(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    image = models.CharField('Картинка', max_length=255, unique=True)
+    status = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    worker = models.CharField('Обработчик', max_length=32, blank=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Задание на миниатюры'
+        verbose_name_plural = 'Задания на миниатюры'
+        indexes = (
+            models.Index(
+                fields=('status', 'created'),
+                name='thumbnailjob_status_idx',
+            ),
+        )
+
+    def __str__(self):
+        return self.image
+
+
+class ReleasedImage(models.Model):
+    """Картинка, на которую перестали ссылаться посты.
+
+    Файл удаляет collect_released_images спустя время, за которое
+    успевает сохраниться пост с такой же загруженной картинкой.
+    """
+    image = models.CharField('Картинка', max_length=255, unique=True)
+    released = models.DateTimeField('Освобождена', db_index=True)
+
+    class Meta:
+        ordering = ('released',)
+        verbose_name = 'Освобождённая картинка'
+        verbose_name_plural = 'Освобождённые картинки'
+
+    def __str__(self):
+        return self.image
@@ -0,0 +1,239 @@
+import copy
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'posts.paginators.cursor'
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, id).
+
+    Переход по курсору выбирает страницу условием по индексу
+    вместо OFFSET и не считает объекты, поэтому не зависит от глубины
+    листания. Число объектов можно передать в count из счётчиков,
+    тогда COUNT не выполняется; без него первая страница строится
+    без номеров страниц.
+
+    Номера страниц (?page=N) по-прежнему поддерживаются. Первые и
+    последние seek_pages страниц выбираются с небольшим OFFSET от
+    начала или от конца ленты; только на них и ведут ссылки с номерами.
+    """
+    ordering = ('-pub_date', '-id')
+    key_fields = ('pub_date', 'id')
+    ELLIPSIS = '…'
+    on_each_side = 3
+    on_ends = 1
+    seek_pages = 4
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        self.counted = count is not None
+        if self.counted:
+            self.count = count
+
+    def get_page(self, number):
+        if not self.counted and number in (None, '', 1, '1'):
+            return self.first_page()
+        return super().get_page(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        if number > self.seek_pages and self.from_end(number):
+            # Страница у конца ленты: по возрастанию от конца,
+            # затем в обратном порядке
+            start = self.count - min(bottom + self.per_page, self.count)
+            stop = self.count - bottom
+            objects = list(self.object_list.reverse()[start:stop])
+            objects.reverse()
+        else:
+            objects = self.object_list[bottom:bottom + self.per_page]
+        return self._get_page(objects, number, self)
+
+    def from_end(self, number):
+        return number > self.num_pages - self.seek_pages
+
+    def first_page(self):
+        """Первая страница без COUNT: следующая есть, если выбралась
+        лишняя строка.
+        """
+        objects = list(self.object_list[:self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        return self._get_page(
+            objects, 1, self.cursor_window(1, len(objects), has_next)
+        )
+
+    def _get_page(self, object_list, number, paginator):
+        page = super()._get_page(object_list, number, paginator)
+        page.next_cursor = None
+        page.previous_cursor = None
+        page.elided_page_range = []
+        if paginator is self:
+            # Номера страниц - только когда известно их число
+            page.elided_page_range = self.get_seek_page_range(page.number)
+        if len(page):
+            if page.has_next():
+                page.next_cursor = self.encode_cursor(
+                    page[-1], page.number + 1
+                )
+            if page.has_previous():
+                page.previous_cursor = self.encode_cursor(
+                    page[0], page.number - 1, backward=True
+                )
+        return page
+
+    def get_elided_page_range(self, number):
+        """Номера страниц вокруг текущей и по краям, пропуски - ELLIPSIS.
+
+        Размер диапазона не зависит от общего числа страниц.
+        """
+        num_pages = self.num_pages
+        window_from = max(number - self.on_each_side, 1)
+        window_to = min(number + self.on_each_side, num_pages)
+        if window_from > self.on_ends + 1:
+            yield from range(1, self.on_ends + 1)
+            yield self.ELLIPSIS
+        else:
+            window_from = 1
+        if window_to < num_pages - self.on_ends:
+            yield from range(window_from, window_to + 1)
+            yield self.ELLIPSIS
+            yield from range(num_pages - self.on_ends + 1, num_pages + 1)
+        else:
+            yield from range(window_from, num_pages + 1)
+
+    def get_seek_page_range(self, number):
+        """get_elided_page_range без номеров из середины ленты.
+
+        Такие страницы выбираются большим OFFSET, поэтому вместо них -
+        ELLIPSIS; до них доходят по курсорам.
+        """
+        pages = []
+        for item in self.get_elided_page_range(number):
+            if item != self.ELLIPSIS and item != number and not (
+                item <= self.seek_pages or self.from_end(item)
+            ):
+                item = self.ELLIPSIS
+            if item == self.ELLIPSIS and pages and pages[-1] == item:
+                continue
+            pages.append(item)
+        return pages
+
+    def encode_cursor(self, obj, number, backward=False):
+        date_field, id_field = self.key_fields
+        return signing.dumps(
+            {
+                'date': getattr(obj, date_field).isoformat(),
+                'id': getattr(obj, id_field),
+                'number': number,
+                'backward': backward,
+            },
+            salt=CURSOR_SALT,
+        )
+
+    def decode_cursor(self, cursor):
+        position = signing.loads(cursor, salt=CURSOR_SALT)
+        date = parse_datetime(position['date'])
+        if date is None:
+            raise ValueError('Некорректная дата в курсоре')
+        return (
+            date,
+            int(position['id']),
+            max(int(position['number']), 1),
+            bool(position['backward']),
+        )
+
+    def keyset_filter(self, date, obj_id, backward=False):
+        date_field, id_field = (field.lstrip('-') for field in self.ordering)
+        lookup = 'gt' if backward else 'lt'
+        return (
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{date_field: date, f'{id_field}__{lookup}': obj_id})
+        )
+
+    def get_cursor_page(self, cursor):
+        try:
+            date, obj_id, number, backward = self.decode_cursor(cursor)
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return self.get_page(1)
+        posts = self.object_list.filter(
+            self.keyset_filter(date, obj_id, backward)
+        )
+        if backward:
+            posts = posts.reverse()
+        posts = list(posts[:self.per_page + 1])
+        if not posts:
+            return self.get_page(1)
+        more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if backward:
+            posts.reverse()
+            # Назад по курсору: дальше всегда есть страница, с которой
+            # пришли, а без лишней строки это начало ленты
+            number = max(number, 2) if more else 1
+            has_next = True
+        else:
+            number = max(number, 2)
+            has_next = more
+        return self._get_page(
+            posts, number, self.cursor_window(number, len(posts), has_next)
+        )
+
+    def cursor_window(self, number, length, has_next):
+        """Копия паджинатора для страницы, открытой по курсору.
+
+        Вместо COUNT число объектов - известная часть ленты: до конца
+        страницы и ещё один объект, если есть следующая. Этого хватает
+        для has_next(), has_previous() и номеров объектов на странице.
+        """
+        window = copy.copy(self)
+        window.__dict__.pop('num_pages', None)
+        window.count = (
+            (number - 1) * self.per_page + length + int(has_next)
+        )
+        return window
+
+    def get_cursor_slice(self, cursor=None):
+        """Следующие per_page объектов после курсора и курсор продолжения.
+
+        Подходит для подгрузки «Показать ещё»: страницы не нумеруются
+        и не считаются.
+        """
+        objects = self.object_list
+        if cursor:
+            try:
+                date, obj_id, _, _ = self.decode_cursor(cursor)
+            except (signing.BadSignature, KeyError, TypeError, ValueError):
+                pass
+            else:
+                objects = objects.filter(self.keyset_filter(date, obj_id))
+        objects = list(objects[:self.per_page + 1])
+        if len(objects) <= self.per_page:
+            return objects, None
+        objects = objects[:self.per_page]
+        return objects, self.encode_cursor(objects[-1], 0)
+
+
+class TimelinePaginator(CursorPaginator):
+    """Паджинатор ленты подписок по записям Timeline.
+
+    Страница строится из записей ленты одного пользователя,
+    а в шаблон передаются сами посты.
+    """
+    ordering = ('-pub_date', '-post_id')
+
+    def _get_page(self, object_list, *args, **kwargs):
+        posts = [entry.post for entry in object_list]
+        return super()._get_page(posts, *args, **kwargs)
+
+
+class CommentPaginator(CursorPaginator):
+    """Паджинатор комментариев поста, от новых к старым."""
+    ordering = ('-created', '-id')
+    key_fields = ('created', 'id')
@@ -0,0 +1,247 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import bump_versions_on_commit, post_scopes
+from .counters import (
+    change_counter, change_total_posts, change_user_counter
+)
+from .models import (
+    Comment, Follow, Group, Post, Timeline, User, UserCounters
+)
+from .thumbnails import release_image, request_thumbnails
+from .timeline import bulk_create_timeline
+
+# Поля пользователя, которые показываются как автор поста
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Новый пост раскладывается в ленты всех подписчиков автора."""
+    if not created or raw:
+        return
+    followers = Follow.objects.filter(
+        author_id=instance.author_id
+    ).values_list('user_id', flat=True)
+    bulk_create_timeline(
+        (
+            Timeline(
+                user_id=user_id,
+                author_id=instance.author_id,
+                post_id=instance.id,
+                pub_date=instance.pub_date,
+            )
+            for user_id in followers.iterator()
+        )
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    """При подписке в ленту добавляются уже опубликованные посты автора."""
+    if not created or raw:
+        return
+    posts = Post.objects.filter(
+        author_id=instance.author_id
+    ).values_list('id', 'pub_date')
+    bulk_create_timeline(
+        (
+            Timeline(
+                user_id=instance.user_id,
+                author_id=instance.author_id,
+                post_id=post_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        )
+    )
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """При отписке посты автора удаляются из ленты."""
+    Timeline.objects.filter(
+        user_id=instance.user_id,
+        author_id=instance.author_id,
+    ).delete()
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю группу поста, если при правке она меняется."""
+    instance._previous_group = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_group = Post.objects.filter(pk=instance.pk).exclude(
+        group_id=instance.group_id
+    ).values_list('group_id', 'group__slug').first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = post_scopes(
+        instance.pk,
+        instance.author.username,
+        instance.group.slug if instance.group_id else None,
+    )
+    previous_group = getattr(instance, '_previous_group', None)
+    if previous_group and previous_group[1]:
+        scopes.append(f'group:{previous_group[1]}')
+    bump_versions_on_commit(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump_versions_on_commit(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    bump_versions_on_commit('groups', f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    bump_versions_on_commit(f'profile:{instance.author.username}')
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_names(sender, instance, raw=False, update_fields=None,
+                            **kwargs):
+    """Запоминает прежние имя и логин пользователя, если они меняются.
+
+    Сохранение только других полей, например last_login при входе,
+    не проверяется.
+    """
+    instance._previous_names = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        AUTHOR_NAME_FIELDS
+    ):
+        return
+    previous = User.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_NAME_FIELDS
+    ).first()
+    current = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if previous != current:
+        instance._previous_names = previous
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, **kwargs):
+    """Имя автора показано на лентах, в профиле и на страницах постов."""
+    previous = getattr(instance, '_previous_names', None)
+    if not previous:
+        return
+    bump_versions_on_commit(
+        'authors',
+        f'author:{instance.pk}',
+        f'profile:{previous[0]}',
+        f'profile:{instance.username}',
+    )
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        change_user_counter(instance.author_id, 'posts_count', 1)
+        change_total_posts(1)
+    else:
+        previous_group = getattr(instance, '_previous_group', None)
+        if not previous_group:
+            return
+        if previous_group[0]:
+            change_counter(
+                Group.objects.filter(pk=previous_group[0]), 'posts_count', -1
+            )
+    if instance.group_id:
+        change_counter(
+            Group.objects.filter(pk=instance.group_id), 'posts_count', 1
+        )
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_user_counter(instance.author_id, 'posts_count', -1)
+    change_total_posts(-1)
+    if instance.group_id:
+        change_counter(
+            Group.objects.filter(pk=instance.group_id), 'posts_count', -1
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comment(sender, instance, created=True, raw=False, **kwargs):
+    if not created or raw:
+        return
+    delta = 1 if kwargs['signal'] is post_save else -1
+    change_counter(
+        Post.objects.filter(pk=instance.post_id), 'comments_count', delta
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follow(sender, instance, created=True, raw=False, **kwargs):
+    if not created or raw:
+        return
+    delta = 1 if kwargs['signal'] is post_save else -1
+    change_user_counter(instance.author_id, 'followers_count', delta)
+    change_user_counter(instance.user_id, 'following_count', delta)
+
+
+@receiver(post_save, sender=Post)
+def enqueue_thumbnails(sender, instance, created, raw=False, **kwargs):
+    """Новая картинка ставится в очередь, даже если такая уже
+    обработана: обработчик заполнит поля поста о ней. Так же
+    ставится картинка, у поста которой нет вариантов: их могло
+    затереть сохранение объекта, загруженного до обработки.
+    """
+    changed = getattr(instance, '_previous_image', None) is not None
+    if raw or not instance.image:
+        return
+    if created or changed or not instance.image_variants:
+        request_thumbnails(instance.image.name)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_image(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнюю картинку поста, если при правке она меняется.
+
+    Пустая строка - у поста не было картинки, None - картинка та же.
+    """
+    instance._previous_image = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_image = Post.objects.filter(pk=instance.pk).exclude(
+        image=instance.image.name or ''
+    ).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def release_post_image(sender, instance, **kwargs):
+    """Картинка освобождается после фиксации транзакции, когда
+    на неё не ссылается ни один пост.
+    """
+    if kwargs['signal'] is post_save:
+        name = getattr(instance, '_previous_image', None)
+    else:
+        name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
@@ -0,0 +1,55 @@
+import json
+
+from django import template
+from sorl.thumbnail import default
+
+from posts.thumbnails import POST_IMAGE_HEIGHT_RATIO
+
+register = template.Library()
+
+FEED_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{default.storage.url(name)} {width}w' for width, name in variants
+    )
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, sizes=FEED_IMAGE_SIZES):
+    """<picture> с вариантами картинки поста разных форматов и ширин.
+
+    Разметка строится только из полей поста, без обращения к хранилищу.
+    Пока варианты не созданы, показывается оригинал; до загрузки
+    картинки место под ней закрашено её средним цветом.
+    """
+    context = {'sizes': sizes, 'color': post.image_color}
+    try:
+        variants = json.loads(post.image_variants or '{}')
+    except ValueError:
+        # Поле - кэш вариантов; испорченное значение заменит обработчик
+        variants = {}
+    fallback = variants.pop('JPEG', None)
+    if not fallback:
+        return {
+            **context,
+            'src': post.image.url,
+            'width': post.image_width,
+            'height': post.image_height,
+        }
+    width, name = fallback[-1]
+    return {
+        **context,
+        'sources': [
+            {
+                'type': f'image/{image_format.lower()}',
+                'srcset': srcset(image_variants),
+            }
+            for image_format, image_variants in variants.items()
+        ],
+        'src': default.storage.url(name),
+        'srcset': srcset(fallback),
+        'width': width,
+        'height': round(width * POST_IMAGE_HEIGHT_RATIO),
+    }
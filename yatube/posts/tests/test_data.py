@@ -5,7 +5,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from faker import Faker
 from http import HTTPStatus
@@ -14,6 +14,7 @@ import shutil
 import tempfile
 
 from posts.models import Post, Group
+from posts.thumbnails import process_pending
 
 User = get_user_model()
 
@@ -89,6 +90,9 @@ class UrlViewData():
         return ''.join((self.url, '?page=', str(page_num)))
 
 
+# Превышение бюджета SQL-запросов на страницу валит тест,
+# картинки и миниатюры пишутся во временный каталог
+@override_settings(QUERY_BUDGET_STRICT=True, MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class DataTestCase(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -225,6 +229,8 @@ class DataTestCase(TestCase):
             image=cls.image,
         )
         cls.post = Post.objects.create(**cls.test_post._asdict())
+        # Миниатюры создаются заранее, как это делает process_thumbnails
+        process_pending(workers=0, batch_size=50)
 
         # Create test comment
         cls.test_comment = TestComment(
@@ -243,6 +249,9 @@ class DataTestCase(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.authorized_user)
         cache.clear()
+        # Картинки общие для тестов, а форма теперь читает файл
+        for image in (self.image, self.image2):
+            image.seek(0)
 
     @classmethod
     def tearDownClass(cls):
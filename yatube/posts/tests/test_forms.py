@@ -1,5 +1,11 @@
 # posts/tests/test_forms.py
-from posts.models import Post
+from io import BytesIO, StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from posts.models import Post, ThumbnailJob
+from posts.thumbnails import finish, post_image_variants
 from django.test import override_settings
 from posts.tests.test_data import (
     DataTestCase,
@@ -64,7 +70,13 @@ class PostFormTests(DataTestCase):
         tested_data = (
             (changed_form_data.text, tested_post.text),
             (changed_form_data.group, tested_post.group.id),
-            (f'posts/{changed_form_data.image.name}', tested_post.image.name),
+            (
+                tested_post.image.storage.content_name(
+                    f'posts/{changed_form_data.image.name}',
+                    changed_form_data.image,
+                ),
+                tested_post.image.name,
+            ),
         )
         for expected, tested in tested_data:
             with self.subTest(field=tested):
@@ -96,3 +108,104 @@ class PostFormTests(DataTestCase):
         for expected, tested in tested_data:
             with self.subTest(field=tested):
                 self.assertEqual(tested, expected)
+
+    def test_thumbnail_job_processed(self):
+        """Загруженная картинка ставится в очередь на миниатюры,
+        а обработчик очереди их создаёт
+        """
+        tested_post = Post.objects.create(**self.test_post._asdict())
+        url = self.url_edit.get_url_with_id(tested_post.id)
+        self.authorized_client.post(
+            url,
+            data=PostFormData(
+                text=self.fake.text(),
+                group=self.group.id,
+                image=self.image2,
+            )._asdict(),
+        )
+        tested_post.refresh_from_db()
+        job = ThumbnailJob.objects.get(image=tested_post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        detail_url = self.url_detail.get_url_with_id(tested_post.id)
+        # Пока миниатюры нет, страница показывает оригинал
+        for url in (detail_url, self.url_main_page.url):
+            response = self.client.get(url)
+            self.assertContains(response, tested_post.image.url)
+        call_command('process_thumbnails', workers=0, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.DONE, job.error)
+        # Варианты записаны в пост, шаблон не ищет их в хранилище
+        tested_post.refresh_from_db()
+        self.assertTrue(tested_post.image_variants)
+        # Обработка сбрасывает закэшированные страницы
+        response = self.client.get(self.url_main_page.url)
+        self.assertNotContains(response, tested_post.image.url)
+        response = self.client.get(detail_url)
+        self.assertNotContains(response, tested_post.image.url)
+        # Браузер выбирает вариант нужной ширины и формата
+        for image_format, width, _, _ in post_image_variants():
+            with self.subTest(image_format=image_format, width=width):
+                self.assertContains(response, f' {width}w')
+                if image_format != 'JPEG':
+                    self.assertContains(
+                        response, f'type="image/{image_format.lower()}"'
+                    )
+
+    def test_thumbnail_job_deleted_while_processing(self):
+        """Задание, удалённое во время обработки, просто пропускается"""
+        job_id = ThumbnailJob.objects.create(image='posts/deleted.gif').id
+        ThumbnailJob.objects.filter(id=job_id).delete()
+        for error in ('', 'cannot identify image file'):
+            with self.subTest(error=error):
+                finish(job_id, error, {'image_width': 4321})
+        self.assertFalse(Post.objects.filter(image_width=4321).exists())
+
+    def make_jpeg(self, size, orientation=None):
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        data = BytesIO()
+        Image.new('RGB', size, 'red').save(data, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            'big.jpg', data.getvalue(), content_type='image/jpeg'
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploaded_image_shrunk_without_exif(self):
+        """Большая картинка уменьшается, поворачивается по EXIF,
+        а сами метаданные EXIF удаляются
+        """
+        self.authorized_client.post(
+            self.url_create.url,
+            data=PostFormData(
+                text='Картинка с EXIF',
+                group=self.group.id,
+                # Поворот на 90 градусов: ширина и высота меняются местами
+                image=self.make_jpeg((400, 200), orientation=6),
+            )._asdict(),
+        )
+        post = Post.objects.get(text='Картинка с EXIF')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.getexif())
+        # Размеры и цвет-заглушка известны сразу после загрузки
+        self.assertEqual((post.image_width, post.image_height), (50, 100))
+        self.assertRegex(post.image_color, r'^#f[0-9a-f]0{4}$')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_uploaded_image_too_many_pixels(self):
+        """Картинка с числом пикселей больше предела отклоняется"""
+        response = self.authorized_client.post(
+            self.url_create.url,
+            data=PostFormData(
+                text='Слишком большая картинка',
+                group=self.group.id,
+                image=self.make_jpeg((200, 200)),
+            )._asdict(),
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка 200x200 слишком большая'
+        )
+        self.assertFalse(
+            Post.objects.filter(text='Слишком большая картинка').exists()
+        )
@@ -1,5 +1,32 @@
 # posts/tests/test_models.py
-from posts.tests.test_data import DataTestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from posts.management.commands.explain_feeds import (
+    feed_queries,
+    is_slow_plan,
+)
+from posts.models import (
+    Comment,
+    Follow,
+    Post,
+    ReleasedImage,
+    Timeline,
+    UserCounters,
+)
+from posts.tests.test_data import DataTestCase, TEMP_MEDIA_ROOT
+from posts.thumbnails import collect_released_images
+
+User = get_user_model()
 
 
 class PostModelTest(DataTestCase):
@@ -30,3 +57,187 @@ class PostModelTest(DataTestCase):
         for value, excepted in tested_objects:
             with self.subTest(value=value, excepted=excepted):
                 self.assertEqual(value, excepted)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании, переносе и удалении записей,
+        а команда recount_counters восстанавливает их по базе
+        """
+        post = Post.objects.create(
+            text=self.fake.text(), author=self.author2, group=self.group
+        )
+        comment = Comment.objects.create(**self.test_comment._asdict())
+        Follow.objects.create(**self.test_follow._asdict())
+        post.group = self.group2
+        post.save()
+        tested_counters = (
+            (self.group, 'posts_count'),
+            (self.group2, 'posts_count'),
+            (self.post, 'comments_count'),
+            (self.author2.counters, 'posts_count'),
+            (self.author3.counters, 'followers_count'),
+            (self.author.counters, 'following_count'),
+        )
+        expected = (
+            Post.objects.filter(group=self.group).count(),
+            Post.objects.filter(group=self.group2).count(),
+            self.post.comments.count(),
+            self.author2.posts.count(),
+            self.author3.following.count(),
+            self.author.follower.count(),
+        )
+
+        def assert_counters():
+            for (obj, field), count in zip(tested_counters, expected):
+                obj.refresh_from_db()
+                with self.subTest(obj=obj, field=field):
+                    self.assertEqual(getattr(obj, field), count)
+
+        assert_counters()
+        UserCounters.objects.update(posts_count=0, followers_count=0)
+        Post.objects.update(comments_count=0)
+        call_command('recount_counters', stdout=StringIO())
+        assert_counters()
+        comment.delete()
+        post.delete()
+        self.post.refresh_from_db()
+        self.author2.counters.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.author2.counters.posts_count, 0)
+
+    def test_counters_not_negative(self):
+        """Удаление при разошедшемся нулевом счётчике оставляет ноль"""
+        comment = Comment.objects.create(**self.test_comment._asdict())
+        Post.objects.filter(pk=self.post.pk).update(comments_count=0)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают индексы без полного сканирования и сортировки"""
+        queries = feed_queries(
+            user_id=self.author.id,
+            author_id=self.author.id,
+            group_id=self.group.id,
+            post_id=self.post.id,
+        )
+        for name, queryset in queries:
+            plan = queryset.explain()
+            with self.subTest(query=name, plan=plan):
+                self.assertFalse(is_slow_plan(plan))
+
+    def test_generate_data(self):
+        """generate_data создаёт связанные данные и заполняет ленты"""
+        posts_count = Post.objects.count()
+        call_command(
+            'generate_data', users=5, groups=2, posts=30, comments=20,
+            follows=2, seed=1, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), posts_count + 30)
+        self.assertEqual(
+            Timeline.objects.count(),
+            Post.objects.filter(
+                author__following__isnull=False
+            ).count(),
+        )
+        for user in UserCounters.objects.all():
+            self.assertEqual(
+                user.posts_count,
+                Post.objects.filter(author_id=user.user_id).count(),
+            )
+
+    def test_export_import_posts(self):
+        """Выгрузка и загрузка NDJSON сохраняет связи между объектами"""
+        Comment.objects.create(
+            text='Комментарий', author=self.author, post=self.post
+        )
+        posts_count = Post.objects.count()
+        comments_count = Comment.objects.count()
+        follows_count = Follow.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.ndjson')
+            media_dir = os.path.join(directory, 'media')
+            call_command(
+                'export_posts', path, media_dir=media_dir, stderr=StringIO()
+            )
+            copied = os.path.join(media_dir, self.post.image.name)
+            with open(copied, 'rb') as copy:
+                with self.post.image.open('rb') as image:
+                    self.assertEqual(copy.read(), image.read())
+            call_command(
+                'import_posts', path, stdout=StringIO(), stderr=StringIO()
+            )
+        self.assertEqual(Post.objects.count(), posts_count * 2)
+        self.assertEqual(Comment.objects.count(), comments_count * 2)
+        # Пользователи сопоставлены по username, подписки не задвоились
+        self.assertEqual(Follow.objects.count(), follows_count)
+        imported = Post.objects.filter(
+            text=self.post.text
+        ).exclude(pk=self.post.pk).get()
+        self.assertEqual(imported.author_id, self.post.author_id)
+        self.assertEqual(imported.pub_date, self.post.pub_date)
+        self.assertEqual(
+            list(imported.comments.values_list('text', flat=True)),
+            list(self.post.comments.values_list('text', flat=True)),
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageStorageTests(TransactionTestCase):
+    """Картинки освобождаются после фиксации транзакции, поэтому тест
+    работает без обёртки TestCase в транзакцию.
+    """
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, author, content, name='image.gif'):
+        post = Post(text='Пост с картинкой', author=author)
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_same_images_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом, который
+        удаляется после последнего ссылающегося на него поста
+        """
+        author = User.objects.create_user(username='storage')
+        first = self.create_post(author, b'GIF89a same', 'first.gif')
+        second = self.create_post(author, b'GIF89a same', 'second.gif')
+        other = self.create_post(author, b'GIF89a other')
+        storage = first.image.storage
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        first.delete()
+        collect_released_images(delay=timedelta())
+        self.assertTrue(storage.exists(second.image.name))
+        # Замена картинки освобождает прежний файл
+        name = second.image.name
+        second.image = other.image.name
+        second.save()
+        self.assertTrue(storage.exists(name))
+        collect_released_images(delay=timedelta())
+        self.assertFalse(storage.exists(name))
+        second.delete()
+        collect_released_images(delay=timedelta())
+        self.assertTrue(storage.exists(other.image.name))
+
+    def test_reuploaded_image_not_collected(self):
+        """Картинку, загруженную снова после освобождения, не удаляет
+        сборка, даже если пост с ней ещё не сохранён
+        """
+        author = User.objects.create_user(username='storage')
+        post = self.create_post(author, b'GIF89a reused')
+        name = post.image.name
+        storage = post.image.storage
+        post.delete()
+        released = ReleasedImage.objects.get(image=name)
+        # Загрузка того же содержимого в ещё не зафиксированный пост
+        time.sleep(0.01)
+        self.assertEqual(
+            storage.save('posts/again.gif', ContentFile(b'GIF89a reused')),
+            name,
+        )
+        self.assertEqual(collect_released_images(delay=timedelta()), 0)
+        self.assertTrue(storage.exists(name))
+        released.refresh_from_db()
+        self.assertEqual(released.released, storage.get_modified_time(name))
@@ -1,9 +1,31 @@
 # posts/tests/test_views.py
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+
 from django.core.cache import cache
 from collections import namedtuple
 from django import forms
-
-from posts.models import Post, Follow, Comment
+from django.conf import settings
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.middleware import QueryBudgetExceeded
+from core.template_loaders import warm_up
+from yatube import settings_production
+
+from posts.caching import bump_versions, cache_get_or_set, get_versions
+from posts.counters import recount_counters, total_posts
+
+from posts.models import Post, Follow, Comment, User
+from posts.paginators import CursorPaginator
+from posts.thumbnails import process_pending, resolve_variants
+from posts.views import NUMBER_DISPLAYED_COMMENTS
 from posts.tests.test_data import (
     DataTestCase,
     FakePaginator,
@@ -78,6 +100,8 @@ class PostViewTests(DataTestCase):
                 group_id=test_post.group,
             )) for i in range(range_from, range_to)])
             range_from += number
+        # bulk_create не вызывает сигналы счётчиков
+        recount_counters()
 
     @classmethod
     def tearDownClass(cls):
@@ -203,6 +227,112 @@ class PostViewTests(DataTestCase):
                         len(response.context.get('page_obj')), number
                     )
 
+    def test_paginator_cursor_walks_all_records(self):
+        """Переход по курсорам проходит ленту без пропусков и повторов
+        в обоих направлениях
+        """
+        url = self.url_main_page.url
+        expected_ids = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        pages = []
+        response = self.authorized_client.get(url)
+        while True:
+            page_obj = response.context['page_obj']
+            pages.append([post.id for post in page_obj])
+            cursor = page_obj.next_cursor
+            if cursor is None:
+                break
+            response = self.authorized_client.get(url, {'cursor': cursor})
+        with self.subTest(direction='forward'):
+            self.assertEqual(sum(pages, []), expected_ids)
+            self.assertEqual(page_obj.number, len(pages))
+        for expected_page in reversed(pages[:-1]):
+            cursor = page_obj.previous_cursor
+            response = self.authorized_client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            with self.subTest(direction='backward', number=page_obj.number):
+                self.assertEqual([post.id for post in page_obj], expected_page)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_paginator_cursor_page_not_counted(self):
+        """Страница по курсору не считает посты и не ссылается
+        на глубокие номера страниц
+        """
+        url = self.url_main_page.url
+        response = self.authorized_client.get(url)
+        cursor = response.context['page_obj'].next_cursor
+        cache.clear()
+        total_posts()
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.authorized_client.get(url, {'cursor': cursor})
+        page_obj = response.context['page_obj']
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(
+            page_obj.has_next(),
+            Post.objects.count() > 2 * FakePaginator(0).records_per_page
+        )
+        self.assertEqual(
+            set(re.findall(r'[?&]page=(\d+)', response.content.decode())),
+            {'1'}
+        )
+
+    def test_paginator_elided_page_range(self):
+        """Паджинатор выводит окно вокруг текущей страницы и края"""
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        last = paginator.num_pages
+        ellipsis = paginator.ELLIPSIS
+        tested_data = (
+            (1, [1, 2, 3, 4, ellipsis, last]),
+            (10, [1, ellipsis, 7, 8, 9, 10, 11, 12, 13, ellipsis, last]),
+            (last, [1, ellipsis] + list(range(last - 3, last + 1))),
+        )
+        for number, expected in tested_data:
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), expected
+                )
+
+    def test_paginator_pages_from_counters(self):
+        """Число постов берётся из счётчиков, последние страницы
+        выбираются с конца ленты, а ссылки ведут только на края
+        """
+        posts = list(Post.objects.order_by('-pub_date', '-id'))
+        paginator = CursorPaginator(Post.objects.all(), 1, count=len(posts))
+        last = paginator.num_pages
+        ellipsis = paginator.ELLIPSIS
+        with CaptureQueriesContext(connections['default']) as queries:
+            for number in (1, 2, last - 1, last):
+                with self.subTest(number=number):
+                    self.assertEqual(
+                        list(paginator.page(number)), [posts[number - 1]]
+                    )
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+        self.assertNotIn(
+            f'OFFSET {last - 1}', ' '.join(query['sql'] for query in queries)
+        )
+        self.assertEqual(
+            paginator.get_seek_page_range(10),
+            [1, ellipsis, 10, ellipsis, last],
+        )
+        self.assertEqual(
+            paginator.get_seek_page_range(1), [1, 2, 3, 4, ellipsis, last]
+        )
+        cache.clear()
+        total_posts()
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.authorized_client.get(self.url_main_page.url)
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']]
+        )
+
     def test_grop_post_added(self):
         """Пост с группой попал на начальную страницу,
         страницу только своей группы и в профайл
@@ -290,20 +420,84 @@ class PostViewTests(DataTestCase):
                 )
 
     def test_cash_safe_main_page(self):
-        """Проверка хранения и удаления кэша"""
+        """Проверка хранения кэша и его сброса при изменении постов"""
         url = self.url_main_page.url
         post = Post.objects.create(**self.test_post._asdict())
         response = self.authorized_client.get(url)
         posts = response.content
-        post.delete()
+        # Обновление в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=post.pk).update(text=self.fake.text())
         response_cached = self.authorized_client.get(url)
         cached_posts = response_cached.content
-        cache.clear()
-        response_cleared_cache = self.authorized_client.get(url)
-        cleared_cache_posts = response_cleared_cache.content
+        post.delete()
+        response_invalidated = self.authorized_client.get(url)
+        invalidated_posts = response_invalidated.content
         with self.subTest():
             self.assertEqual(cached_posts, posts)
-            self.assertNotEqual(cleared_cache_posts, cached_posts)
+            self.assertNotEqual(invalidated_posts, cached_posts)
+
+    def test_post_card_fragment_cache(self):
+        """Карточка поста берётся из кэша, пока не изменится её версия"""
+        url = self.url_main_page.url
+        post = Post.objects.create(**self.test_post._asdict())
+        self.authorized_client.get(url)
+        new_text = 'Текст в обход сигналов'
+        Post.objects.filter(pk=post.pk).update(text=new_text)
+        # Страница собирается заново, но карточка остаётся из кэша
+        bump_versions('posts')
+        response_cached = self.authorized_client.get(url)
+        bump_versions('posts', f'card:{post.pk}')
+        response_invalidated = self.authorized_client.get(url)
+        with self.subTest():
+            self.assertNotContains(response_cached, new_text)
+            self.assertContains(response_invalidated, new_text)
+
+    def test_versions_bumped_after_commit(self):
+        """Версии страниц повышаются и после фиксации транзакции"""
+        connection = connections['default']
+        callbacks = len(connection.run_on_commit)
+        Comment.objects.create(**self.test_comment._asdict())
+        scope = f'post:{self.post.id}'
+        version = get_versions([scope])
+        for _, callback in connection.run_on_commit[callbacks:]:
+            callback()
+        del connection.run_on_commit[callbacks:]
+        self.assertNotEqual(get_versions([scope]), version)
+
+    def test_cache_invalidated_by_comment(self):
+        """Новый комментарий сразу виден на закэшированной странице поста"""
+        url = self.url_detail.get_url_with_id(self.post.id)
+        self.authorized_client.get(url)
+        comment = Comment.objects.create(
+            **self.test_comment._replace(text='Свежий комментарий')._asdict()
+        )
+        response = self.authorized_client.get(url)
+        self.assertContains(response, comment.text)
+
+    def test_cache_invalidated_by_author_rename(self):
+        """Новое имя автора сразу видно на закэшированных страницах,
+        а вход пользователя их не сбрасывает
+        """
+        urls = (
+            self.url_main_page.url,
+            self.url_group.url,
+            self.url_auth.url,
+            self.url_detail.get_url_with_id(self.post.id),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        versions = get_versions(['authors', f'profile:{self.author}'])
+        Client().force_login(self.author)
+        self.assertEqual(
+            get_versions(['authors', f'profile:{self.author}']), versions
+        )
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.authorized_client.get(url), 'Переименованный'
+                )
 
     def test_404_get_castom_template(self):
         """Проверка того, что ошибка 404 даёт кастомный шаблон"""
@@ -435,3 +629,272 @@ class PostViewTests(DataTestCase):
                 count_before_unfollowed,
                 count_after_unfollowed
             )
+
+    def test_follow_timeline_backfill_and_prune(self):
+        """Проверка. При подписке в ленту попадают прежние посты автора,
+        при отписке - удаляются
+        """
+        url = self.url_follow_list.url
+        author_posts = set(
+            Post.objects.filter(author=self.author2).order_by(
+                '-pub_date', '-id'
+            ).values_list('id', flat=True)[:10]
+        )
+        Follow.objects.create(author=self.author2, user=self.author)
+        response = self.authorized_client.get(url)
+        followed_posts = {post.id for post in response.context['page_obj']}
+        Follow.objects.filter(author=self.author2, user=self.author).delete()
+        response = self.authorized_client.get(url)
+        unfollowed_posts = len(response.context['page_obj'])
+        with self.subTest(url=url):
+            self.assertEqual(followed_posts, author_posts)
+            self.assertEqual(unfollowed_posts, 0)
+
+    def test_search_finds_posts(self):
+        """Поиск находит посты по словам и префиксу и видит правки текста"""
+        post = Post.objects.create(
+            text='Необычайно редкое словосочетание', author=self.author
+        )
+        url = '/search/'
+        tested_data = (
+            ('редкое', [post]),
+            ('НЕОБЫЧАЙНО словосоч', [post]),
+            ('редкое отсутствующее', []),
+            ('', []),
+        )
+        for query, expected in tested_data:
+            with self.subTest(query=query):
+                response = self.client.get(url, {'q': query})
+                self.assertEqual(list(response.context['page_obj']), expected)
+        post.text = 'Совсем другой текст'
+        post.save()
+        response = self.client.get(url, {'q': 'редкое'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_post_detail_comments_paginated(self):
+        """На странице поста выводится первая порция комментариев,
+        остальные подгружаются по курсору без повторов
+        """
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author2, text=str(i))
+            for i in range(NUMBER_DISPLAYED_COMMENTS + 5)
+        )
+        expected_ids = list(
+            self.post.comments.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        response = self.client.get(
+            self.url_detail.get_url_with_id(self.post.id)
+        )
+        loaded_ids = [comment.id for comment in response.context['comments']]
+        cursor = response.context['comments_cursor']
+        self.assertEqual(len(loaded_ids), NUMBER_DISPLAYED_COMMENTS)
+        response = self.client.get(
+            f'/posts/{self.post.id}/comments/', {'cursor': cursor}
+        )
+        loaded_ids += [comment.id for comment in response.context['comments']]
+        with self.subTest():
+            self.assertEqual(loaded_ids, expected_ids)
+            self.assertIsNone(response.context['comments_cursor'])
+
+    def test_query_budget_middleware(self):
+        """Ответ содержит Server-Timing, а превышение бюджета запросов
+        валит тест
+        """
+        url = self.url_main_page.url
+        response = self.authorized_client.get(url)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        cache.clear()
+        with override_settings(QUERY_BUDGETS={'posts:index': 1}):
+            with self.assertLogs('yatube.query_budget', 'WARNING') as logs:
+                with self.assertRaises(QueryBudgetExceeded):
+                    self.authorized_client.get(url)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['budget'], 1)
+        self.assertGreater(record['queries'], 1)
+
+    def test_production_templates_render_same_html(self):
+        """Кэширующий загрузчик с подстановкой include даёт тот же HTML"""
+        urls = (
+            self.url_main_page.url,
+            self.url_group.url,
+            self.url_auth.url,
+            self.url_detail.get_url_with_id(self.post.id),
+        )
+        guest_client = Client()
+
+        def get_content(url):
+            # Курсоры подписаны с отметкой времени
+            return re.sub(
+                rb'cursor=[^"&]+', b'cursor=', guest_client.get(url).content
+            )
+
+        expected = [get_content(url) for url in urls]
+        with override_settings(TEMPLATES=settings_production.TEMPLATES):
+            count, _ = warm_up()
+            cache.clear()
+            actual = [get_content(url) for url in urls]
+        self.assertGreater(count, 0)
+        for url, content, expected_content in zip(urls, actual, expected):
+            with self.subTest(url=url):
+                self.assertEqual(content, expected_content)
+
+    def test_cached_page_shared_between_users(self):
+        """Закэшированная страница общая, а шапка и кнопки - свои у каждого"""
+        username = self.authorized_user.username
+        guest_client = Client()
+        for url in (self.url_main_page.url, self.url_auth.url):
+            with self.subTest(url=url):
+                cache.clear()
+                guest_client.get(url)
+                user_response = self.authorized_client.get(url)
+                guest_response = guest_client.get(url)
+                self.assertContains(
+                    user_response, f'Пользователь: {username}'
+                )
+                self.assertNotContains(guest_response, 'Пользователь:')
+                self.assertContains(guest_response, 'Войти')
+                self.assertNotContains(user_response, '<!--hole:')
+        follow_url = reverse('posts:profile_follow', args=(username,))
+        self.assertNotContains(user_response, follow_url)
+        self.assertNotContains(guest_response, follow_url)
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag получает 304, пока данные не изменились"""
+        url = self.url_main_page.url
+        response = self.authorized_client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        not_modified = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=etag
+        )
+        guest_response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        Post.objects.create(**self.test_post._asdict())
+        modified = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        with self.subTest():
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(guest_response.status_code, 200)
+            self.assertEqual(modified.status_code, 200)
+            self.assertNotEqual(modified['ETag'], etag)
+
+    def test_cache_get_or_set_coalesces(self):
+        """Значение вычисляется один раз, а во время пересчёта другим
+        процессом отдаётся устаревшее
+        """
+        calls = []
+
+        def compute():
+            time.sleep(0.01)
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(cache_get_or_set('key', compute, 60), 1)
+        self.assertEqual(cache_get_or_set('key', compute, 60), 1)
+        # Значение близко к сроку: при большом beta пересчёт неизбежен
+        self.assertEqual(cache_get_or_set('key', compute, 60, beta=1e12), 2)
+        cache_get_or_set('old', compute, 60, stale_key='stale')
+        cache.add('new:lock', True)
+        self.assertEqual(
+            cache_get_or_set('new', compute, 60, stale_key='stale'), 3
+        )
+        self.assertEqual(len(calls), 3)
+
+    def test_resolve_variants_batched(self):
+        """Варианты картинок постов, ещё не записанные в посты,
+        берутся из хранилища ключей sorl одним запросом на страницу
+        """
+        for number, image in enumerate((self.image, self.image2) * 2):
+            Post.objects.create(**self.test_post._replace(
+                text=f'Пост {number}', image=image
+            )._asdict())
+        process_pending(workers=0, batch_size=50)
+        Post.objects.update(image_variants='')
+        cache.clear()
+        posts = list(Post.objects.exclude(image=''))
+        self.assertEqual(len({post.image.name for post in posts}), 2)
+        with self.assertNumQueries(1):
+            resolve_variants(posts)
+        self.assertTrue(all(post.image_variants for post in posts))
+        # Промахи и находки запомнены в кэше
+        for post in posts:
+            post.image_variants = ''
+        with self.assertNumQueries(0):
+            resolve_variants(posts)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_LAG=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Основная база и реплика - два файла SQLite; «репликация» -
+    копирование основной базы в файл реплики.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica_path = os.path.join(directory.name, 'replica.sqlite3')
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': self.replica_path,
+        }
+        connections.ensure_defaults('replica')
+        connections.prepare_test_settings('replica')
+        self.addCleanup(self.remove_replica)
+        cache.clear()
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+
+    def replicate(self):
+        connections['replica'].close()
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connections['default'].connection.backup(replica)
+        replica.close()
+
+    def test_reads_from_replica_and_reads_own_writes(self):
+        """Ленты читаются из реплики, а автор записи - из основной базы"""
+        user = User.objects.create_user(username='reader')
+        post = Post.objects.create(author=user, text='Старый пост')
+        client = Client()
+        client.force_login(user)
+        self.replicate()
+        Post.objects.create(author=user, text='Неотреплицированный пост')
+        guest_client = Client()
+        detail_url = reverse('posts:post_detail', args=(post.id,))
+
+        response = guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Неотреплицированный пост')
+
+        client.post(
+            reverse('posts:add_comment', args=(post.id,)),
+            {'text': 'Свой комментарий'},
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, client.cookies)
+        self.assertContains(client.get(detail_url), 'Свой комментарий')
+        cache.clear()
+        self.assertNotContains(
+            guest_client.get(detail_url), 'Свой комментарий'
+        )
+
+    @override_settings(REPLICA_LAG=0.5)
+    def test_replica_page_not_cached_under_new_version(self):
+        """Страница из отстающей реплики не кэшируется под версией
+        только что изменённых данных
+        """
+        user = User.objects.create_user(username='writer')
+        Post.objects.create(author=user, text='Старый пост')
+        self.replicate()
+        cache.clear()
+        Post.objects.create(author=user, text='Новый пост')
+        guest_client = Client()
+        index_url = reverse('posts:index')
+        # Запись не переводит чтения всего сайта на основную базу
+        self.assertNotContains(guest_client.get(index_url), 'Новый пост')
+        self.replicate()
+        time.sleep(settings.REPLICA_LAG)
+        self.assertContains(guest_client.get(index_url), 'Новый пост')
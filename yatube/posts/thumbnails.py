@@ -0,0 +1,344 @@
+import json
+import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings, settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .caching import bump_versions, post_scopes
+from .images import describe_image
+from .models import Post, ReleasedImage, ThumbnailJob
+
+# Варианты картинки поста: ширины для srcset и форматы для <picture>.
+# AVIF и WebP создаются, только если Pillow и sorl умеют их сохранять;
+# JPEG - запасной вариант для всех браузеров.
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_HEIGHT_RATIO = 339 / 960
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True}
+Image.init()
+POST_IMAGE_FORMATS = tuple(
+    image_format for image_format in ('AVIF', 'WEBP')
+    if image_format in Image.SAVE and image_format in EXTENSIONS
+) + ('JPEG',)
+
+
+def post_image_variants():
+    """Кортежи (формат, ширина, геометрия sorl, параметры sorl)."""
+    for image_format in POST_IMAGE_FORMATS:
+        for width in POST_IMAGE_WIDTHS:
+            height = round(width * POST_IMAGE_HEIGHT_RATIO)
+            yield image_format, width, f'{width}x{height}', {
+                **POST_IMAGE_OPTIONS, 'format': image_format,
+            }
+
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+# Через сколько после освобождения удаляется файл картинки: за это
+# время сохраняется пост, загрузивший такую же картинку
+RELEASE_DELAY = timedelta(hours=1)
+
+logger = logging.getLogger('yatube.images')
+
+
+def enqueue(names):
+    ThumbnailJob.objects.bulk_create(
+        (ThumbnailJob(image=name) for name in names if name),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def request_thumbnails(*names):
+    """Ставит картинки в очередь заново, даже если они уже обработаны."""
+    enqueue(names)
+    ThumbnailJob.objects.filter(
+        image__in=names, status=ThumbnailJob.DONE
+    ).update(status=ThumbnailJob.PENDING)
+
+
+def source_image(name):
+    """Картинка поста для sorl: ключи миниатюр зависят от хранилища."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def release_image(name):
+    """Отмечает картинку на удаление, если посты на неё не ссылаются.
+
+    Одинаковые картинки хранятся одним файлом, поэтому число ссылок -
+    это число постов с таким именем картинки. Файл удалит
+    collect_released_images.
+    """
+    if not name or Post.objects.filter(image=name).exists():
+        return
+    ReleasedImage.objects.update_or_create(
+        image=name, defaults={'released': timezone.now()}
+    )
+
+
+def _collect_released(storage, candidate):
+    name = candidate.image
+    with storage.locked(name):
+        if Post.objects.filter(image=name).exists():
+            candidate.delete()
+            return False
+        if (
+            storage.exists(name)
+            and storage.get_modified_time(name) > candidate.released
+        ):
+            # Файл загрузили снова: пост с ним ещё может сохраниться
+            candidate.released = storage.get_modified_time(name)
+            candidate.save(update_fields=('released',))
+            return False
+        ThumbnailJob.objects.filter(image=name).delete()
+        image = source_image(name)
+        default.kvstore.delete(image)
+        image.delete()
+    candidate.delete()
+    return True
+
+
+def collect_released_images(delay=RELEASE_DELAY):
+    """Удаляет картинки, освобождённые раньше delay, и их миниатюры.
+
+    Загрузка того же содержимого не пишет файл заново, а ссылку на него
+    сохраняет позже, в своей транзакции. Поэтому ссылки проверяются
+    спустя delay, а файл, загруженный повторно после освобождения,
+    ждёт ещё delay. Возвращает число удалённых картинок.
+    """
+    storage = Post._meta.get_field('image').storage
+    deleted = 0
+    released = ReleasedImage.objects.filter(
+        released__lte=timezone.now() - delay
+    )
+    for candidate in released:
+        try:
+            deleted += _collect_released(storage, candidate)
+        except (OSError, SuspiciousFileOperation) as error:
+            # Файл уберёт обслуживание хранилища
+            logger.warning(
+                'Не удалось удалить картинку %s: %s', candidate.image, error
+            )
+            candidate.delete()
+    return deleted
+
+
+def generate(name):
+    """Создаёт все варианты картинки и возвращает поля Post о ней."""
+    backend = ThumbnailBackend()
+    source = source_image(name)
+    variants = {}
+    for image_format, width, geometry, options in post_image_variants():
+        thumbnail = backend.get_thumbnail(source, geometry, **options)
+        variants.setdefault(image_format, []).append((width, thumbnail.name))
+    with source.storage.open(name) as image:
+        fields = describe_image(image)
+    return {**fields, 'image_variants': json.dumps(variants)}
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не создаёт миниатюры во время запроса.
+
+    Готовая миниатюра берётся из хранилища ключей; если её нет,
+    картинка ставится в очередь process_thumbnails, а шаблон
+    получает оригинал.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = self.lookup(source, geometry_string, **options)
+        if thumbnail:
+            return thumbnail
+        request_thumbnails(source.name)
+        return source
+
+    def lookup(self, source, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей или None."""
+        name = self.thumbnail_name(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def thumbnail_name(self, source, geometry_string, options):
+        # Параметры дополняются так же, как в ThumbnailBackend,
+        # чтобы имя миниатюры совпало с созданной обработчиком.
+        options = {**options}
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+
+def resolve_variants(posts):
+    """Дополняет посты без сохранённых вариантов картинок готовыми
+    миниатюрами из хранилища ключей sorl.
+
+    Это посты, чьи картинки ещё не прошли обработчик после появления
+    поля image_variants. Ключи всех вариантов всех постов читаются
+    одним get_many из кэша и одним запросом к базе для промахов,
+    а не запросом на каждую миниатюру. Промахи запоминаются в кэше
+    так же, как это делает sorl. Варианты записываются только
+    в объекты постов; в базу их запишет обработчик очереди.
+    """
+    posts = list(posts)
+    pending = [
+        post for post in posts if post.image and not post.image_variants
+    ]
+    if not pending:
+        return posts
+    backend = QueuedThumbnailBackend()
+    wanted = []
+    for post in pending:
+        source = source_image(post.image.name)
+        variants = []
+        for image_format, width, geometry, options in post_image_variants():
+            name = backend.thumbnail_name(source, geometry, options)
+            key = add_prefix(ImageFile(name, default.storage).key)
+            variants.append((image_format, width, name, key))
+        wanted.append((post, variants))
+    keys = {key for _, variants in wanted for *_, key in variants}
+    kv_cache = default.kvstore.cache
+    found = kv_cache.get_many(keys)
+    missing = keys - found.keys()
+    if missing:
+        found.update(
+            KVStoreModel.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kv_cache.set_many(
+            {key: found.get(key, EMPTY_VALUE) for key in missing},
+            settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+    for post, variants in wanted:
+        if any(
+            found.get(key, EMPTY_VALUE) == EMPTY_VALUE
+            for *_, key in variants
+        ):
+            continue
+        sources = {}
+        for image_format, width, name, _ in variants:
+            sources.setdefault(image_format, []).append((width, name))
+        post.image_variants = json.dumps(sources)
+    return posts
+
+
+def _process(job_id, name):
+    try:
+        fields = generate(name)
+    except Exception as error:
+        return job_id, repr(error), None
+    return job_id, '', fields
+
+
+def _init_worker():
+    django.setup()
+    connections.close_all()
+
+
+def requeue_stale():
+    """Возвращает в очередь задания упавших обработчиков."""
+    ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PROCESSING,
+        updated__lt=timezone.now() - STALE_AFTER,
+    ).update(status=ThumbnailJob.PENDING, worker='')
+
+
+def claim(batch_size):
+    worker = uuid.uuid4().hex
+    with transaction.atomic():
+        ids = list(
+            ThumbnailJob.objects.filter(
+                status=ThumbnailJob.PENDING
+            ).values_list('id', flat=True)[:batch_size]
+        )
+        ThumbnailJob.objects.filter(
+            id__in=ids, status=ThumbnailJob.PENDING
+        ).update(
+            status=ThumbnailJob.PROCESSING,
+            worker=worker,
+            attempts=F('attempts') + 1,
+        )
+    return list(
+        ThumbnailJob.objects.filter(worker=worker).values_list(
+            'id', 'image'
+        )
+    )
+
+
+def finish(job_id, error, fields=None):
+    job = ThumbnailJob.objects.filter(id=job_id).values_list(
+        'image', 'attempts'
+    ).first()
+    if job is None:
+        # Задание удалено вместе с картинкой, пока создавались миниатюры
+        return
+    name, attempts = job
+    if not error:
+        status = ThumbnailJob.DONE
+        posts = Post.objects.filter(image=name)
+        if fields:
+            posts.update(**fields)
+        # Страницы и карточки постов с этой картинкой показывали оригинал
+        scopes = set()
+        for post in posts.values_list('id', 'author__username', 'group__slug'):
+            scopes.update(post_scopes(*post))
+        bump_versions(*scopes)
+    else:
+        status = (
+            ThumbnailJob.FAILED if attempts >= MAX_ATTEMPTS
+            else ThumbnailJob.PENDING
+        )
+    ThumbnailJob.objects.filter(id=job_id).update(
+        status=status, worker='', error=error
+    )
+
+
+def process_pending(workers, batch_size):
+    """Обрабатывает очередь заданий, пока она не опустеет.
+
+    При workers == 0 миниатюры создаются в текущем процессе.
+    Возвращает число обработанных заданий.
+    """
+    requeue_stale()
+    processed = 0
+    executor = None
+    try:
+        while True:
+            jobs = claim(batch_size)
+            if not jobs:
+                return processed
+            if workers and executor is None:
+                # Соединения с БД не должны наследоваться дочерними процессами
+                connections.close_all()
+                executor = ProcessPoolExecutor(
+                    workers, initializer=_init_worker
+                )
+            if executor is None:
+                results = (_process(job_id, name) for job_id, name in jobs)
+            else:
+                results = executor.map(_process, *zip(*jobs))
+            for job_id, error, fields in results:
+                finish(job_id, error, fields)
+                processed += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,30 @@
+from django.db import connection, transaction
+
+from .bulk import bulk_create
+from .models import Follow, Post, Timeline
+
+TIMELINE_BATCH_SIZE = 1000
+
+
+def bulk_create_timeline(entries):
+    bulk_create(
+        Timeline, entries, TIMELINE_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def rebuild_timeline():
+    """Заполняет ленты подписок заново по подпискам и постам.
+
+    Нужна после загрузки данных в обход сигналов (bulk_create).
+    """
+    timeline = Timeline._meta.db_table
+    follow = Follow._meta.db_table
+    post = Post._meta.db_table
+    with transaction.atomic():
+        Timeline.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {timeline} (user_id, author_id, post_id, '
+                f'pub_date) SELECT f.user_id, f.author_id, p.id, p.pub_date '
+                f'FROM {follow} f JOIN {post} p ON p.author_id = f.author_id'
+            )
@@ -1,32 +1,66 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, Timeline, User
+from . import fts
+from .caching import attach_card_versions, cache_page_versioned
+from .counters import total_posts
 from .forms import PostForm, CommentForm
+from .paginators import (
+    CommentPaginator,
+    CursorPaginator,
+    TimelinePaginator,
+)
+from .thumbnails import resolve_variants
 
 NUMBER_DISPLAYED_POSTS = 10
+NUMBER_DISPLAYED_COMMENTS = 20
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
 
 
-def paginator_get_page(posts_list, request):
-    paginator = Paginator(posts_list, NUMBER_DISPLAYED_POSTS)
-    return paginator.get_page(request.GET.get('page'))
+def paginator_get_page(posts_list, request, paginator_class=CursorPaginator,
+                       count=None):
+    paginator = paginator_class(
+        posts_list, NUMBER_DISPLAYED_POSTS, count=count
+    )
+    cursor = request.GET.get('cursor')
+    if cursor:
+        page = paginator.get_cursor_page(cursor)
+    else:
+        page = paginator.get_page(request.GET.get('page'))
+    page.object_list = resolve_variants(
+        attach_card_versions(page.object_list)
+    )
+    return page
+
+
+def post_detail_cache_scopes(post_id):
+    username = Post.objects.filter(id=post_id).values_list(
+        'author__username', flat=True
+    ).first()
+    return ('groups', f'post:{post_id}', f'profile:{username}')
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_page_versioned(
+    PAGE_CACHE_TIMEOUT, lambda: ('groups', 'authors', 'posts')
+)
 def index(request):
     posts_list = Post.objects.select_related('group', 'author')
-    page_obj = paginator_get_page(posts_list, request)
+    page_obj = paginator_get_page(posts_list, request, count=total_posts())
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_versioned(
+    PAGE_CACHE_TIMEOUT, lambda slug: ('groups', 'authors', f'group:{slug}')
+)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts_list = group.posts.select_related('author')
-    page_obj = paginator_get_page(posts_list, request)
+    page_obj = paginator_get_page(
+        posts_list, request, count=group.posts_count
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -34,39 +68,83 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_versioned(
+    PAGE_CACHE_TIMEOUT, lambda username: ('groups', f'profile:{username}')
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
     posts_list = author.posts.select_related('group')
-    page_obj = paginator_get_page(posts_list, request)
-    following = None
-    if request.user.is_authenticated:
-        following = author.following.filter(user=request.user).exists()
-    myself = (author == request.user)
+    counters = getattr(author, 'counters', None)
+    page_obj = paginator_get_page(
+        posts_list, request, count=counters and counters.posts_count
+    )
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following,
-        'myself': myself,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_page_versioned(PAGE_CACHE_TIMEOUT, post_detail_cache_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), id=post_id
+    )
+    resolve_variants((post,))
     form = CommentForm()
-    comments = post.comments.select_related('author')
+    comments, comments_cursor = get_comments_slice(post.id)
     context = {
         'post': post,
         'title': post.text[:30],
         'form': form,
         'comments': comments,
+        'comments_cursor': comments_cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def get_comments_slice(post_id, cursor=None):
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        NUMBER_DISPLAYED_COMMENTS,
+    )
+    return paginator.get_cursor_slice(cursor)
+
+
+@cache_page_versioned(
+    PAGE_CACHE_TIMEOUT, lambda post_id: (f'post:{post_id}',)
+)
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments, comments_cursor = get_comments_slice(
+        post_id, request.GET.get('cursor')
+    )
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'comments_cursor': comments_cursor,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts_list = fts.search(
+        Post.objects.select_related('group', 'author'), query
+    )
+    page_obj = paginator_get_page(posts_list, request)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required(login_url='/')
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -115,15 +193,10 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    user = request.user
-    follows_list = Follow.objects.filter(user=user)
-    authors_list = set()
-    for follow in follows_list:
-        authors_list.add(follow.author)
-    posts_list = Post.objects.filter(
-        author__in=authors_list
-    ).select_related('group', 'author')
-    page_obj = paginator_get_page(posts_list, request)
+    timeline = Timeline.objects.filter(
+        user=request.user
+    ).select_related('post__group', 'post__author')
+    page_obj = paginator_get_page(timeline, request, TimelinePaginator)
     context = {
         'page_obj': page_obj,
     }
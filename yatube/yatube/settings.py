@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -47,7 +49,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -64,17 +66,46 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Разбирать все шаблоны при старте процесса, см. yatube/wsgi.py
+TEMPLATE_WARM_UP = False
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite с режимом WAL и прагмами, см. core.db.sqlite3.base.PRAGMAS
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплики только для чтения, см. core.routers
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+if os.getenv('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DATABASE_REPLICA'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+REPLICA_READ_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:post_comments',
+    'posts:follow_index',
+]
+# Сколько секунд после своей записи клиент читает из основной базы
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'replica_pin'
+# Наибольшее ожидаемое отставание реплик в секундах
+REPLICA_LAG = 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -118,16 +149,57 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сразу пишутся во временный файл и не держатся в памяти
+FILE_UPLOAD_HANDLERS = (
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+# Пределы для картинок постов, см. posts.images
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 1920
+
 LOGIN_URL = 'auth:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Общий для всех процессов узла кэш: страницы, фрагменты шаблонов,
+# версии данных и хранилище ключей sorl-thumbnail. Значения в файле
+# распаковываются pickle, поэтому он лежит в каталоге проекта,
+# а не в общем для всех пользователей /tmp
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
+# Тесты получают свой файл кэша на каждый прогон
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
+
+# Миниатюры создаёт только команда process_thumbnails
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Бюджеты SQL-запросов на запрос по имени представления,
+# см. core.middleware.QueryBudgetMiddleware
+QUERY_BUDGET_DEFAULT = 15
+QUERY_BUDGETS = {
+    'posts:index': 10,
+    'posts:group_list': 10,
+    'posts:profile': 12,
+    'posts:post_detail': 10,
+    'posts:post_comments': 4,
+    'posts:follow_index': 10,
+    'posts:search': 10,
+}
+QUERY_DUPLICATE_THRESHOLD = 3
+QUERY_BUDGET_STRICT = False
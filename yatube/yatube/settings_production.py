@@ -0,0 +1,36 @@
+"""Настройки для боевого запуска:
+DJANGO_SETTINGS_MODULE=yatube.settings_production
+"""
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import TEMPLATES
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# Шаблоны читаются и разбираются один раз на процесс; статические
+# {% include %} из каталога templates подставляются при разборе.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'context_processors': [
+                processor
+                for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor != 'django.template.context_processors.debug'
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'core.template_loaders.FlatteningLoader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+TEMPLATE_WARM_UP = True